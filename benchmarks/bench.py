@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+"""
+Benchmarks für ClearURL
+
+Misst Durchsatz und Latenz-Perzentile von filter_url im Regel-, Auto-,
+Voll- und Standardmodus, die Lade- und Zusammenführungszeit der Regeln mit
+einer AdGuard-Liste in voller Größe sowie den Speicherbedarf. Das Ergebnis
+wird als JSON ausgegeben, damit Versionen miteinander verglichen werden können.
+
+Aufruf (aus dem Wurzelverzeichnis des Repositorys):
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --only rule --urls 50000
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Gemessen wird der Stand im Arbeitsverzeichnis, nicht eine installierte Version
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import clearurl
+from clearurl import Filter
+from clearurl.updater import parse_adguard_rules, save_adguard_rules, load_adguard_rules
+from clearurl.ruleset import RuleSnapshot, read_rule_file, merge_rules
+
+from corpus import DEFAULT_SEED, make_rule_set, adguard_lines, make_corpus
+from stubserver import start_stub_server
+
+SECTIONS = ("rule", "auto", "load", "memory")
+
+
+def summarize(samples, total):
+    """Fasst Einzelmessungen (Sekunden pro URL) zu Durchsatz und Perzentilen zusammen"""
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def percentile(q):
+        return round(ordered[min(int(q * count), count - 1)] * 1e6, 3)
+
+    return {
+        "urls": count,
+        "seconds": round(total, 6),
+        "urls_per_second": round(count / total, 1) if total else None,
+        "latency_us": {
+            "mean": round(sum(ordered) / count * 1e6, 3),
+            "p50": percentile(0.50),
+            "p90": percentile(0.90),
+            "p99": percentile(0.99),
+            "p999": percentile(0.999),
+            "max": round(ordered[-1] * 1e6, 3),
+        },
+    }
+
+
+def time_each(func, items):
+    """Ruft func für jedes Element auf und misst jeden Aufruf einzeln"""
+    clock = time.perf_counter
+    samples = []
+    append = samples.append
+    started = clock()
+    for item in items:
+        t = clock()
+        func(item)
+        append(clock() - t)
+    return summarize(samples, clock() - started)
+
+
+def time_repeated(func, repeat):
+    """Führt func mehrfach aus und liefert Minimum und Median der Laufzeit in Sekunden"""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return {"min": round(durations[0], 6), "median": round(durations[len(durations) // 2], 6)}, result
+
+
+def make_filter(rule_file, **kwargs):
+    """Erzeugt einen Filter, der weder lernt noch Dateien neben den Regeln anlegt"""
+    options = dict(use_adguard=False, auto_update=False, self_study=False,
+                   snapshot_file=False, journal_file=False, verdicts=False)
+    options.update(kwargs)
+    return Filter(rule_file=rule_file, **options)
+
+
+class Workspace(object):
+    """Synthetischer Regelsatz samt Regeldateien in einem temporären Verzeichnis"""
+    def __init__(self, args):
+        self.dir = tempfile.mkdtemp(prefix="clearurl-bench-")
+        self.rule_set = make_rule_set(args.hosts, args.general, seed=args.seed)
+        self.specific, self.general = adguard_lines(self.rule_set)
+        self.user_rule_file = os.path.join(os.path.dirname(clearurl.__file__), "rules", "default_rules.yaml")
+        self.adguard_file = os.path.join(self.dir, "adguard_rules.yaml")
+        self.rule_file = os.path.join(self.dir, "merged_rules.yaml")
+
+        adguard_rules = parse_adguard_rules(self.specific, self.general)
+        save_adguard_rules(adguard_rules, self.adguard_file)
+        rules = read_rule_file(self.user_rule_file)
+        merge_rules(rules, adguard_rules)
+        import yaml
+        with open(self.rule_file, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(rules, f, sort_keys=False, allow_unicode=True)
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def bench_rule(args, ws):
+    """Regelmodus ohne Netzwerk: einzelne URLs, Stapelverarbeitung und Cache"""
+    urls = make_corpus(ws.rule_set, args.urls, hit_rate=args.hit_rate,
+                       query_less=args.query_less, seed=args.seed)
+    filter = make_filter(ws.rule_file)
+    result = {"corpus": len(urls)}
+
+    # Der erste Durchlauf kompiliert die Regeln der getroffenen Hosts
+    started = time.perf_counter()
+    for url in urls:
+        filter.filter_url(url, mode="rule")
+    result["cold_seconds"] = round(time.perf_counter() - started, 6)
+
+    gc.collect()
+    result["filter_url"] = time_each(lambda u: filter.filter_url(u, mode="rule"), urls)
+    result["changed_rate"] = round(sum(filter.filter_url(u, mode="rule") != u for u in urls) / len(urls), 4)
+
+    started = time.perf_counter()
+    filter.filter_urls(urls, mode="rule")
+    total = time.perf_counter() - started
+    result["filter_urls"] = {"urls": len(urls), "seconds": round(total, 6),
+                             "urls_per_second": round(len(urls) / total, 1)}
+
+    # Mit Cache: erster Durchlauf füllt ihn, der zweite wird gemessen
+    cached = make_filter(ws.rule_file, cache_size=len(urls))
+    for url in urls:
+        cached.filter_url(url, mode="rule")
+    gc.collect()
+    result["filter_url_cached"] = time_each(lambda u: cached.filter_url(u, mode="rule"), urls)
+    return result
+
+
+def bench_auto(args, ws):
+    """Auto-, Voll- und Standardmodus gegen den lokalen Stub-Server"""
+    server, base = start_stub_server(args.page_size, args.delay)
+    try:
+        urls = make_corpus(ws.rule_set, args.auto_urls, hit_rate=args.hit_rate,
+                           query_less=0.0, base=base, seed=args.seed)
+        result = {"corpus": len(urls), "page_size": args.page_size, "delay": args.delay}
+        for name, mode in (("auto", "auto"), ("full", "full"), ("default", None)):
+            filter = make_filter(ws.user_rule_file, probe_strategy=args.probe_strategy)
+            stats = time_each(lambda u: filter.filter_url(u, mode=mode), urls)
+            stats["probes"] = filter.probe_stats["probes"]
+            result[name] = stats
+
+        # Mit Urteilsspeicher im Speicher entfallen Abrufe für bekannte Parameter
+        filter = make_filter(ws.user_rule_file, probe_strategy=args.probe_strategy, verdicts=None)
+        stats = time_each(lambda u: filter.filter_url(u, mode="auto"), urls)
+        stats["probes"] = filter.probe_stats["probes"]
+        result["auto_verdicts"] = stats
+    finally:
+        server.shutdown()
+        server.server_close()
+    return result
+
+
+def bench_load(args, ws):
+    """Parsen, Laden, Zusammenführen und Indizieren der Regeln"""
+    repeat = args.repeat
+    result = {
+        "specific_lines": len(ws.specific),
+        "general_lines": len(ws.general),
+        "adguard_file_bytes": os.path.getsize(ws.adguard_file),
+    }
+    result["parse_adguard"], adguard_rules = time_repeated(
+        lambda: parse_adguard_rules(ws.specific, ws.general), repeat)
+    result["hosts"] = len(adguard_rules["hosts"])
+    result["save_adguard"], _ = time_repeated(lambda: save_adguard_rules(adguard_rules, ws.adguard_file), repeat)
+    result["load_adguard"], _ = time_repeated(lambda: load_adguard_rules(ws.adguard_file), repeat)
+
+    def merge():
+        rules = read_rule_file(ws.user_rule_file)
+        merge_rules(rules, adguard_rules)
+        return rules
+    result["merge"], rules = time_repeated(merge, repeat)
+    result["build_index"], _ = time_repeated(lambda: RuleSnapshot(rules).build_index(), repeat)
+
+    result["filter_init_yaml"], filter = time_repeated(lambda: make_filter(ws.rule_file), repeat)
+    snapshot_file = os.path.join(ws.dir, "compiled_rules.bin")
+    result["compile_rules"], _ = time_repeated(lambda: filter.compile_rules(snapshot_file), repeat)
+    result["filter_init_snapshot"], _ = time_repeated(
+        lambda: make_filter(ws.rule_file, snapshot_file=snapshot_file), repeat)
+    return result
+
+
+def bench_memory(args, ws):
+    """Speicherbedarf eines Filters mit allen Regeln, vor und nach einem Korpus"""
+    urls = make_corpus(ws.rule_set, args.urls, hit_rate=args.hit_rate,
+                       query_less=args.query_less, seed=args.seed)
+    gc.collect()
+    tracemalloc.start()
+    filter = make_filter(ws.rule_file)
+    rules_bytes, init_peak = tracemalloc.get_traced_memory()
+    for url in urls:
+        filter.filter_url(url, mode="rule")
+    gc.collect()
+    after_bytes, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "filter_bytes": rules_bytes,
+        "init_peak_bytes": init_peak,
+        "after_corpus_bytes": after_bytes,
+        "peak_bytes": peak,
+    }
+    if resource is not None:
+        # ru_maxrss ist unter Linux in KiB, unter macOS in Bytes angegeben
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result["max_rss_bytes"] = maxrss if sys.platform == "darwin" else maxrss * 1024
+    return result
+
+
+def git_revision():
+    """Liefert den aktuellen Commit des Repositorys oder None"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ClearURL-Benchmarks mit synthetischen Daten")
+    parser.add_argument("--only", action="append", choices=SECTIONS,
+                        help="Nur diesen Teil messen (mehrfach angebbar, Standard: alle)")
+    parser.add_argument("--urls", type=int, default=20000, help="Anzahl der URLs im Regelmodus")
+    parser.add_argument("--auto-urls", type=int, default=200, help="Anzahl der URLs im Auto-Modus")
+    parser.add_argument("--hosts", type=int, default=20000, help="Anzahl der Hosts mit eigener Regel")
+    parser.add_argument("--general", type=int, default=300, help="Anzahl der allgemeinen Parameter")
+    parser.add_argument("--hit-rate", type=float, default=0.5,
+                        help="Anteil der URLs mit Query, die zu entfernende Parameter enthalten")
+    parser.add_argument("--query-less", type=float, default=0.2, help="Anteil der URLs ohne Query")
+    parser.add_argument("--page-size", type=int, default=20000, help="Seitengröße des Stub-Servers in Bytes")
+    parser.add_argument("--delay", type=float, default=0.0, help="Antwortzeit des Stub-Servers in Sekunden")
+    parser.add_argument("--probe-strategy", choices=["single", "group"], default="single")
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen der Lade-Messungen")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("-o", "--output", metavar="DATEI", help="JSON in diese Datei statt auf stdout schreiben")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    sections = args.only or SECTIONS
+    benchmarks = {"rule": bench_rule, "auto": bench_auto, "load": bench_load, "memory": bench_memory}
+
+    ws = Workspace(args)
+    try:
+        results = {}
+        for name in sections:
+            print(f"Messe {name}...", file=sys.stderr)
+            results[name] = benchmarks[name](args, ws)
+    finally:
+        ws.cleanup()
+
+    report = {
+        "meta": {
+            "clearurl_version": clearurl.__version__,
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "parameters": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
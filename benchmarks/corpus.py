@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+"""
+Synthetische Regeln und URL-Korpora für die Benchmarks
+
+Alle Daten werden aus einem Seed erzeugt, sodass Messungen verschiedener
+Versionen auf identischen Eingaben beruhen. Hosts und Parameter folgen einer
+Zipf-Verteilung: wenige Hosts und Tracking-Parameter machen den Großteil des
+Verkehrs aus, die meisten Host-Regeln werden nur selten getroffen.
+"""
+
+import random
+
+DEFAULT_SEED = 1
+
+# Häufige Tracking-Parameter (nach Häufigkeit geordnet, vorne am häufigsten)
+TRACKING_PARAMS = [
+    "utm_source", "utm_medium", "utm_campaign", "fbclid", "gclid", "utm_content",
+    "utm_term", "mc_cid", "mc_eid", "msclkid", "_ga", "yclid", "igshid", "dclid",
+    "ref_src", "spm", "scm", "_hsenc", "_hsmi", "mkt_tok", "oly_enc_id", "vero_id",
+    "wickedid", "twclid", "ttclid", "gbraid", "wbraid", "_openstat", "s_cid", "trk",
+]
+
+# Parameter, die den Inhalt der Seite bestimmen und nie entfernt werden dürfen
+FUNCTIONAL_PARAMS = ["id", "page", "q", "lang", "sort", "p", "v", "category",
+                     "item", "size", "color", "year", "start", "limit"]
+
+# Reguläre Ausdrücke der allgemeinen Liste
+GENERAL_REGEX = ["/^utm_/", "/^__hs/", "/^pk_(campaign|kwd|source)$/i"]
+
+TLDS = ["com", "de", "net", "org", "co.uk", "fr", "io", "jp"]
+
+WORDS = ["news", "article", "shop", "product", "search", "blog", "video", "post",
+         "category", "tag", "user", "watch", "item", "page", "story", "world"]
+
+
+def zipf_cum_weights(n, s=1.1):
+    """Liefert kumulierte Gewichte einer Zipf-Verteilung über n Ränge"""
+    total = 0.0
+    cum = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** s
+        cum.append(total)
+    return cum
+
+
+def make_rule_set(hosts=20000, general=300, exception_rate=0.02, seed=DEFAULT_SEED):
+    """
+    Erzeugt einen synthetischen Regelsatz in der Größenordnung der AdGuard-Listen
+
+    Args:
+        hosts: Anzahl der Hosts mit eigenen Regeln
+        general: Anzahl der allgemeinen Parameter (mindestens die bekannten
+                 Tracking-Parameter)
+        exception_rate: Anteil der Hosts mit einer Ausnahme (@@)
+        seed: Startwert des Zufallsgenerators
+
+    Returns:
+        Dictionary mit "default" (allgemeine Parameter), "regex" (allgemeine
+        Muster), "hosts" (Host -> Parameterliste) und "exceptions"
+        (Host -> behaltene Parameter)
+    """
+    rng = random.Random(seed)
+    default = TRACKING_PARAMS + [f"trk_{i}" for i in range(max(general - len(TRACKING_PARAMS), 0))]
+    # Host-spezifische Parameter stammen aus einem eigenen Vorrat, damit sie
+    # nie mit den funktionalen Parametern kollidieren
+    pool = [f"hp{i}" for i in range(2000)]
+    pool_weights = zipf_cum_weights(len(pool))
+    host_rules = {}
+    exceptions = {}
+    for i in range(hosts):
+        host = f"site{i}.{TLDS[i % len(TLDS)]}"
+        host_rules[host] = sorted(set(rng.choices(pool, cum_weights=pool_weights, k=rng.randint(1, 3))))
+        if rng.random() < exception_rate:
+            exceptions[host] = [rng.choice(TRACKING_PARAMS)]
+    return {"default": default, "regex": list(GENERAL_REGEX), "hosts": host_rules, "exceptions": exceptions}
+
+
+def adguard_lines(rule_set, domain_group=50):
+    """
+    Schreibt einen Regelsatz als AdGuard-Listen (TrackParamFilter-Syntax)
+
+    Neben ||host^-Regeln enthält die spezifische Liste Ausnahmen und Regeln
+    mit $domain=a|b|c, damit auch die langsameren Pfade des Parsers gemessen
+    werden.
+
+    Returns:
+        Tupel (Zeilen der spezifischen Liste, Zeilen der allgemeinen Liste)
+    """
+    specific = ["! Title: Synthetische TrackParamFilter-Liste"]
+    hosts = list(rule_set["hosts"].items())
+    for i, (host, params) in enumerate(hosts):
+        specific.extend(f"||{host}^$removeparam={p}" for p in params)
+        if domain_group and i % domain_group == 0:
+            group = "|".join(h for h, _ in hosts[i:i + 5])
+            specific.append(f"$removeparam=hp_shared{i},domain={group}")
+    for host, params in rule_set["exceptions"].items():
+        specific.extend(f"@@||{host}^$removeparam={p}" for p in params)
+    general = ["! Title: Synthetische allgemeine Liste"]
+    general.extend(f"$removeparam={p}" for p in rule_set["default"])
+    general.extend(f"$removeparam={r}" for r in rule_set["regex"])
+    return specific, general
+
+
+def make_corpus(rule_set, n=10000, hit_rate=0.5, query_less=0.2, fragment_rate=0.05,
+                known_hosts=0.7, base=None, seed=DEFAULT_SEED):
+    """
+    Erzeugt einen URL-Korpus zu einem Regelsatz
+
+    Args:
+        rule_set: Ergebnis von make_rule_set
+        n: Anzahl der URLs
+        hit_rate: Anteil der URLs mit Query, die mindestens einen zu
+                  entfernenden Parameter enthalten
+        query_less: Anteil der URLs ohne Query
+        fragment_rate: Anteil der URLs mit Fragment
+        known_hosts: Anteil der URLs auf Hosts mit eigener Regel
+        base: Fester Ursprung (z.B. der Stub-Server) statt zufälliger Hosts
+        seed: Startwert des Zufallsgenerators
+
+    Returns:
+        Liste der URLs
+    """
+    rng = random.Random(seed)
+    hosts = list(rule_set["hosts"])
+    host_weights = zipf_cum_weights(len(hosts)) if hosts else None
+    default = rule_set["default"]
+    default_weights = zipf_cum_weights(len(default))
+    urls = []
+    for _ in range(n):
+        removable = None
+        if base is not None:
+            prefix = base
+        elif hosts and rng.random() < known_hosts:
+            host = rng.choices(hosts, cum_weights=host_weights)[0]
+            prefix = f"https://{host}"
+            removable = rule_set["hosts"][host]
+        else:
+            prefix = f"https://www.unknown{rng.randrange(5000)}.example"
+        path = "/" + "/".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        if rng.random() < query_less:
+            urls.append(prefix + path)
+            continue
+
+        params = [(k, str(rng.randrange(1000))) for k in rng.sample(FUNCTIONAL_PARAMS, rng.randint(0, 3))]
+        if rng.random() < hit_rate:
+            if removable:
+                names = rng.sample(removable, rng.randint(1, len(removable)))
+            else:
+                names = set(rng.choices(default, cum_weights=default_weights, k=rng.randint(1, 3)))
+            params.extend((k, f"{rng.getrandbits(32):08x}") for k in names)
+        elif not params:
+            params.append((rng.choice(FUNCTIONAL_PARAMS), str(rng.randrange(1000))))
+        rng.shuffle(params)
+        url = prefix + path + "?" + "&".join(f"{k}={v}" for k, v in params)
+        if rng.random() < fragment_rate:
+            url += "#" + rng.choice(WORDS)
+        urls.append(url)
+    return urls
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+"""
+Lokaler HTTP-Server als Ersatz für echte Seiten im Auto-Modus
+
+Der Inhalt einer Seite hängt nur vom Pfad und den funktionalen Parametern ab;
+alle übrigen Parameter (Tracking) werden ignoriert. Der Auto-Modus sollte sie
+daher als entbehrlich erkennen.
+"""
+
+import time
+import random
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+from corpus import FUNCTIONAL_PARAMS, WORDS
+
+
+@lru_cache(maxsize=4096)
+def render_page(key, size):
+    """Erzeugt eine deterministische HTML-Seite von etwa size Bytes für einen Schlüssel"""
+    rng = random.Random(key)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS) + str(rng.randrange(100))
+        words.append(word)
+        length += len(word) + 1
+    return f"<html><body><p>{' '.join(words)}</p></body></html>".encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        relevant = sorted((k, v) for k, v in parse_qsl(u.query, keep_blank_values=True)
+                          if k in self.server.functional)
+        body = render_page(f"{u.path}?{relevant}", self.server.page_size)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def start_stub_server(page_size=20000, delay=0.0, functional=FUNCTIONAL_PARAMS):
+    """
+    Startet den Stub-Server in einem Hintergrund-Thread auf einem freien Port
+
+    Args:
+        page_size: Ungefähre Größe einer Seite in Bytes
+        delay: Künstliche Antwortzeit in Sekunden
+        functional: Parameter, die den Inhalt der Seite bestimmen
+
+    Returns:
+        Tupel (Server, Basis-URL); der Server wird mit shutdown() beendet
+    """
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.page_size = page_size
+    server.delay = delay
+    server.functional = frozenset(functional)
+    threading.Thread(target=server.serve_forever, name="clearurl-stub", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
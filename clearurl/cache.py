@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import sys
+import threading
+from collections import OrderedDict
+
+# Standard-Ports, die bei der Kanonisierung entfernt werden
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# Zeichen, die das Ende des Netloc-Teils einer URL markieren
+NETLOC_END = "/?#"
+
+
+def split_origin(url):
+    """
+    Zerlegt eine URL ohne vollständiges Parsen in Ursprung und Rest
+
+    Args:
+        url: Die URL als String
+
+    Returns:
+        Tupel (kanonischer Ursprung, Ursprung wie in der Ausgabe, Rest) oder
+        None, wenn die URL keinen Netloc-Teil hat. Der kanonische Ursprung
+        enthält Schema und Host in Kleinbuchstaben, ohne Standard-Port.
+    """
+    sep = url.find("://")
+    if sep <= 0:
+        return None
+    scheme = url[:sep].lower()
+    start = sep + 3
+    end = len(url)
+    for c in NETLOC_END:
+        pos = url.find(c, start)
+        if pos != -1 and pos < end:
+            end = pos
+    netloc = url[start:end]
+    if not netloc:
+        return None
+
+    userinfo, _, hostport = netloc.rpartition("@")
+    host, port = hostport, ""
+    colon = hostport.rfind(":")
+    if colon != -1 and "]" not in hostport[colon:]:
+        host, port = hostport[:colon], hostport[colon + 1:]
+    if port == DEFAULT_PORTS.get(scheme):
+        port = ""
+
+    canonical = scheme + "://"
+    if userinfo:
+        canonical += userinfo + "@"
+    canonical += host.lower()
+    if port:
+        canonical += ":" + port
+    # Die Ausgabe übernimmt den Ursprung unverändert aus der Eingabe
+    return canonical, url[:end], url[end:]
+
+
+class ResultCache(object):
+    """
+    Begrenzter LRU-Cache für gefilterte URLs
+
+    Die Größe ist sowohl über die Anzahl der Einträge als auch optional über
+    den ungefähren Speicherverbrauch in Bytes begrenzt. Alle Operationen sind
+    thread-sicher.
+
+    Jedes clear erhöht generation. Wer generation vor dem Berechnen eines
+    Ergebnisses liest und an put übergibt, speichert kein Ergebnis, das mit
+    inzwischen ersetzten Regeln berechnet wurde.
+    """
+    def __init__(self, maxsize=10000, max_bytes=None):
+        """
+        Args:
+            maxsize: Maximale Anzahl an Einträgen
+            max_bytes: Maximaler ungefährer Speicherverbrauch (None = unbegrenzt)
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Liefert den gespeicherten Wert oder None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, generation=None):
+        """
+        Speichert einen Wert und verdrängt bei Bedarf die ältesten Einträge
+
+        Args:
+            generation: Stand von generation vor dem Berechnen des Werts; wurde
+                        der Cache seitdem geleert, wird nichts gespeichert
+        """
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if self.maxsize <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._data[key] = (value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (
+                    self.max_bytes is not None and self.bytes > self.max_bytes):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        """Leert den Cache (die Zähler bleiben erhalten)"""
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            self.generation += 1
+
+    def info(self):
+        """Liefert Statistiken über den Cache als Dictionary"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "bytes": self.bytes,
+                "maxsize": self.maxsize,
+                "max_bytes": self.max_bytes,
+            }
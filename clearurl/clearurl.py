@@ -2,26 +2,44 @@
 # coding=UTF-8
 
 import os
-import yaml
-import re
-import fnmatch
-import json
-import requests
 import logging
-from difflib import SequenceMatcher
+import time
+import threading
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
-from pathlib import Path
 
-from .updater import update_adguard_rules, load_adguard_rules, get_rules_path
+from .updater import refresh_adguard_rules, load_adguard_rules, get_rules_path
+from .hostindex import HostIndex
+from .cache import ResultCache, split_origin
+from .snapshot import get_snapshot_path, write_snapshot, load_snapshot
+from .probe import Prober
+from .similarity import get_similarity_engine
+from .verdicts import VerdictStore, REMOVABLE, REQUIRED
+from .journal import RuleJournal, merge_params
+from .learning import LearningQueue
+from .query import Query
+from .ruleset import RuleSnapshot, RuleWatcher, read_rule_file, merge_rules, copy_rules, empty_rules
+from .metrics import MetricsRegistry
+from .trace import StageRecorder, call_hooks
 
-# Logger konfigurieren
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('clearurl')
 
+# Gemeinsame HTTP-Session, damit Verbindungen wiederverwendet werden
+_session = None
+_session_lock = threading.Lock()
+
 class Url(object):
     """
     Klasse zur Verarbeitung und Manipulation von URLs
+
+    Die Query wird über parsed_query bearbeitet, das nur die entfernten Paare
+    aus dem Original ausschneidet. Wurde nichts verändert, liefert get_url die
+    ursprüngliche URL zurück, sonst die Original-URL mit ersetzter Query bzw.
+    ersetztem Fragment. query_dict wird erst beim ersten Zugriff erzeugt; wird
+    es verwendet, setzt get_url die Query wie bisher mit urlencode zusammen.
     """
+    __slots__ = ("scheme", "netloc", "host", "path", "params", "query", "fragment",
+                 "original_url", "_parts", "_parsed_query", "_query_dict")
+
     def __init__(self, url=None):
         self.scheme = None
         self.netloc = None
@@ -30,11 +48,12 @@ class Url(object):
         self.params = None
         self.query = None
         self.fragment = None
-        self.query_dict = None
+        self.original_url = url
+        self._parts = None
+        self._parsed_query = None
+        self._query_dict = None
         if url:
-            self.original_url = url
             self.parse_url()
-            self.parse_query()
 
     def parse_url(self):
         """Zerlegt die URL in ihre Bestandteile"""
@@ -46,11 +65,33 @@ class Url(object):
         self.params = u.params
         self.query = u.query
         self.fragment = u.fragment
+        self._parts = tuple(u)
+        self._parsed_query = None
+        self._query_dict = None
         return u
 
+    @property
+    def parsed_query(self):
+        """Die Query als Query-Objekt (Spans im Original, bei Bedarf erzeugt)"""
+        if self._parsed_query is None:
+            self._parsed_query = Query(self.query)
+        return self._parsed_query
+
+    @property
+    def query_dict(self):
+        """Die Query-Parameter als Dictionary wie von parse_qs (bei Bedarf erzeugt)"""
+        if self._query_dict is None:
+            query = self._parsed_query.to_string() if self._parsed_query is not None else self.query
+            self._query_dict = parse_qs(query or "")
+        return self._query_dict
+
+    @query_dict.setter
+    def query_dict(self, query_dict):
+        self._query_dict = query_dict
+
     def parse_query(self):
         """Zerlegt die Query-Parameter in ein Dictionary"""
-        self.query_dict = parse_qs(self.query)
+        self._query_dict = None
         return self.query_dict
 
     def get_query_by_dict(self):
@@ -59,19 +100,75 @@ class Url(object):
 
     def get_url(self):
         """Erstellt die vollständige URL aus allen Komponenten"""
-        self.query = self.get_query_by_dict()
-        return urlunparse((self.scheme, self.netloc, self.path, self.params, self.query, self.fragment))
+        if self._query_dict is not None:
+            self.query = self.get_query_by_dict()
+        elif self._parsed_query is not None:
+            self.query = self._parsed_query.to_string()
+        parts = (self.scheme, self.netloc, self.path, self.params, self.query or "", self.fragment or "")
+        original = self._parts
+        if original is None or parts[:4] != original[:4]:
+            return urlunparse(parts)
+        if parts[4:] == original[4:]:
+            return self.original_url
+        return self.splice(parts[4], parts[5])
+
+    def splice(self, query, fragment):
+        """Ersetzt Query und Fragment in der ursprünglichen URL, der Rest bleibt unverändert"""
+        url = self.original_url
+        hash_pos = url.find('#')
+        end = len(url) if hash_pos == -1 else hash_pos
+        query_pos = url.find('?', 0, end)
+        result = url[:end if query_pos == -1 else query_pos]
+        if query:
+            result += "?" + query
+        if hash_pos != -1 and fragment == self._parts[5]:
+            result += url[hash_pos:]
+        elif fragment:
+            result += "#" + fragment
+        return result
 
     def copy(self):
-        """Erstellt eine Kopie des Url-Objekts"""
-        return Url(self.get_url())
+        """
+        Erstellt eine Kopie des Url-Objekts
+
+        Die Bestandteile werden übernommen statt die URL neu zu parsen; nur
+        die Query-Paare bzw. das Query-Dictionary werden kopiert.
+        """
+        clone = Url.__new__(Url)
+        clone.scheme = self.scheme
+        clone.netloc = self.netloc
+        clone.host = self.host
+        clone.path = self.path
+        clone.params = self.params
+        clone.query = self.query
+        clone.fragment = self.fragment
+        clone.original_url = self.original_url
+        clone._parts = self._parts
+        clone._parsed_query = None if self._parsed_query is None else self._parsed_query.copy()
+        clone._query_dict = None
+        if self._query_dict is not None:
+            clone._query_dict = {k: list(v) for k, v in self._query_dict.items()}
+        return clone
 
 
 class Filter(object):
     """
     Hauptklasse zum Filtern von URLs basierend auf Regeln
+
+    Ein Filter ist thread-sicher: Der Zustand einer einzelnen URL lebt in
+    einem lokalen Url-Objekt und nicht auf der Instanz. Viele Threads können
+    daher gleichzeitig filter_url/filter_urls derselben Instanz aufrufen und
+    teilen sich eine einzige Kopie der Regeln. Änderungen an den Regeln
+    (Lernen, Neuladen, Zusammenführen) werden über eine Sperre serialisiert.
     """
-    def __init__(self, rule_file=None, self_study=True, use_adguard=True, auto_update=True):
+    def __init__(self, rule_file=None, self_study=True, use_adguard=True, auto_update=True,
+                 cache_size=0, cache_max_bytes=None, snapshot_file=None,
+                 probe_workers=8, probe_per_host=4, probe_deadline=30.0,
+                 probe_strategy="single", max_probes=None,
+                 similarity=None, similarity_threshold=0.95, verdicts=None,
+                 journal_file=None, compact_every=1000,
+                 deferred_learning=False, learning_workers=2, learning_queue_size=1000,
+                 watch_interval=None, metrics=None):
         """
         Initialisiert den Filter mit den gegebenen Regeln
         
@@ -80,9 +177,69 @@ class Filter(object):
             self_study: Ob der Filter automatisch neue Regeln lernen soll
             use_adguard: Ob AdGuard-Regeln verwendet werden sollen
             auto_update: Ob AdGuard-Regeln automatisch aktualisiert werden sollen
+            cache_size: Maximale Anzahl gecachter Ergebnisse (0 = kein Cache)
+            cache_max_bytes: Optionale Obergrenze für den Speicher des Caches
+            snapshot_file: Pfad zum binären Regel-Snapshot (None = Standardpfad,
+                           False = keinen Snapshot verwenden); ein veralteter
+                           Snapshot wird nach dem Laden der YAML-Dateien neu
+                           geschrieben, am Standardpfad nur, wenn er existiert
+            probe_workers: Anzahl gleichzeitiger Abrufe im Auto-Modus
+            probe_per_host: Maximale Anzahl gleichzeitiger Abrufe pro Host
+            probe_deadline: Gesamtfrist in Sekunden für die Abrufe einer URL
+            probe_strategy: 'single' prüft jeden Parameter einzeln (N+1 Abrufe),
+                            'group' entfernt Gruppen von Parametern und halbiert
+                            sie nur, wenn sich die Seite ändert
+            max_probes: Maximale Anzahl an Abrufen pro URL (None = unbegrenzt);
+                        nicht mehr geprüfte Parameter bleiben erhalten
+            similarity: Verfahren zum Vergleich der Seiten: None bzw. 'minhash'
+                        (Standard), 'sequence' oder ein eigenes Objekt mit den
+                        Methoden fingerprint und similarity
+            similarity_threshold: Ab dieser Ähnlichkeit gilt ein Parameter als
+                                  entbehrlich; eigene Verfahren sollten wie
+                                  SequenceMatcher.ratio() skaliert sein
+            verdicts: Speicher für Urteile des Auto-Modus: None (nur im
+                      Speicher), Pfad zu einer SQLite-Datei, ein VerdictStore
+                      oder False (keine Urteile merken)
+            journal_file: Journal für gelernte Regeln (None = Regeldatei mit
+                          Endung .journal, False = Regeldatei bei jedem
+                          Lernerfolg vollständig neu schreiben)
+            compact_every: Anzahl an Journal-Einträgen, ab der das Journal im
+                           Hintergrund in die Regeldatei übernommen wird
+            deferred_learning: Im Standardmodus das Regelergebnis sofort liefern
+                               und die Auto-Erkennung im Hintergrund ausführen,
+                               statt auf die Abrufe zu warten
+            learning_workers: Anzahl der Threads für die Hintergrund-Erkennung
+            learning_queue_size: Maximale Anzahl wartender URLs; weitere URLs
+                                 werden verworfen
+            watch_interval: Regeldateien alle so viele Sekunden auf Änderungen
+                            prüfen und bei Bedarf neu laden (None = nicht überwachen)
+            metrics: MetricsRegistry für Latenzen und Trefferzähler, True für
+                     eine neue Registry oder None (keine Metriken)
         """
+        if metrics is True:
+            metrics = MetricsRegistry()
+        self.metrics = metrics
+        self._hooks = ()
         self.study = self_study
         self.use_adguard = use_adguard
+        self.cache = ResultCache(cache_size, cache_max_bytes) if cache_size > 0 else None
+        self._snapshot = RuleSnapshot(empty_rules())
+        self._watcher = None
+        self._lock = threading.RLock()
+        self.adguard_rules = None
+        self.snapshot_file = get_snapshot_path() if snapshot_file is None else snapshot_file
+        self.prober = Prober(self.fetch_page, probe_workers, probe_per_host, probe_deadline)
+        if probe_strategy not in ("single", "group"):
+            raise ValueError(f"Unbekannte Prüfstrategie: {probe_strategy}")
+        self.probe_strategy = probe_strategy
+        self.max_probes = max_probes
+        self.probe_stats = {"urls": 0, "probes": 0}
+        self.similarity = get_similarity_engine(similarity)
+        self.similarity_threshold = similarity_threshold
+        if verdicts is None or isinstance(verdicts, str):
+            verdicts = VerdictStore(verdicts)
+        self.verdicts = verdicts or None
+        self._stats_lock = threading.Lock()
         
         # Bestimme Standard-Regeldatei, falls keine angegeben
         if rule_file is None:
@@ -98,42 +255,305 @@ class Filter(object):
         else:
             self.rule_file = rule_file
         
-        # Lade Regeln
-        self.load_rule_file(self.rule_file)
+        if journal_file is None:
+            journal_file = self.rule_file + ".journal"
+        self.journal = RuleJournal(journal_file) if journal_file else None
+        self.compact_every = compact_every
+        self._compactor = None
+        
+        # Aktualisiere AdGuard-Regeln, falls aktiviert; neu erzeugte Regeln
+        # werden direkt übernommen statt die Datei erneut zu laden
+        fresh_adguard_rules = None
+        if self.use_adguard and auto_update:
+            fresh_adguard_rules = refresh_adguard_rules(metrics=self.metrics)[1]
+        
+        # Lade vorkompilierte Regeln, solange die Quelldateien unverändert sind
+        started = time.perf_counter()
+        if not self.load_compiled_rules():
+            # Lade Regeln
+            loaded = self.load_rule_file(self.rule_file)
+            
+            # Lade AdGuard-Regeln, falls aktiviert
+            if self.use_adguard:
+                self.adguard_rules = fresh_adguard_rules or load_adguard_rules()
+                if self.adguard_rules:
+                    logger.info("AdGuard-Regeln erfolgreich geladen")
+                    self.merge_adguard_rules()
+                else:
+                    logger.warning("Keine AdGuard-Regeln gefunden oder laden fehlgeschlagen")
+                    loaded = False
+
+            # Einen veralteten Snapshot (z.B. nach einer AdGuard-Aktualisierung
+            # oder dem Verdichten des Journals) gleich erneuern, damit der
+            # nächste Start ihn wieder nutzt; gelernte Regeln aus dem Journal
+            # gehören nicht hinein
+            if loaded and self.snapshot_file and (snapshot_file is not None
+                                                  or os.path.exists(self.snapshot_file)):
+                self.compile_rules()
+        if self.metrics is not None:
+            self.metrics.observe("rules_load_seconds", time.perf_counter() - started)
         
-        # Aktualisiere und lade AdGuard-Regeln, falls aktiviert
+        # Noch nicht verdichtete gelernte Regeln übernehmen
+        self.replay_journal()
+
+        self.learning_queue = None
+        if deferred_learning:
+            self.learning_queue = LearningQueue(self, learning_workers, learning_queue_size)
+
+        if watch_interval:
+            self.watch_rules(watch_interval)
+
+    @property
+    def rules(self):
+        """Die aktuell veröffentlichten Regeln"""
+        return self._snapshot.rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._snapshot = RuleSnapshot(rules)
+
+    def snapshot_sources(self):
+        """Liefert die Dateien, aus denen die zusammengeführten Regeln entstehen"""
+        paths = [self.rule_file]
         if self.use_adguard:
-            if auto_update:
-                update_adguard_rules()
-            self.adguard_rules = load_adguard_rules()
-            if self.adguard_rules:
-                logger.info("AdGuard-Regeln erfolgreich geladen")
-                self.merge_adguard_rules()
-            else:
-                logger.warning("Keine AdGuard-Regeln gefunden oder laden fehlgeschlagen")
+            paths.append(get_rules_path())
+        return paths
+
+    def load_compiled_rules(self):
+        """
+        Lädt Regeln und Host-Index aus dem binären Snapshot
+
+        Returns:
+            True, wenn ein gültiger Snapshot geladen wurde, sonst False
+        """
+        if not self.snapshot_file:
+            return False
+        loaded = load_snapshot(self.snapshot_file, self.snapshot_sources(),
+                               {"use_adguard": self.use_adguard})
+        if loaded is None:
+            return False
+        rules, index_state = loaded
+        with self._lock:
+            self._snapshot = RuleSnapshot(rules, HostIndex.from_state(index_state))
+            self.clear_cache()
+        logger.info(f"Regeln aus Snapshot {self.snapshot_file} geladen")
+        return True
+
+    def compile_rules(self, snapshot_file=None):
+        """
+        Schreibt die aktuellen zusammengeführten Regeln als binären Snapshot
+
+        Args:
+            snapshot_file: Zieldatei (Standard: der Snapshot-Pfad des Filters)
+
+        Returns:
+            True bei Erfolg, sonst False
+        """
+        path = snapshot_file or self.snapshot_file or get_snapshot_path()
+        with self._lock:
+            snapshot = self._snapshot
+            index = snapshot.build_index()
+            return write_snapshot(path, snapshot.rules, index, self.snapshot_sources(),
+                                  {"use_adguard": self.use_adguard})
 
     def load_rule_file(self, rule_filename):
-        """Lädt die Regeln aus einer YAML-Datei"""
+        """
+        Lädt die Regeln aus einer YAML-Datei
+
+        Returns:
+            True, wenn die Datei gelesen werden konnte (oder nicht existiert),
+            False, wenn stattdessen leere Regeln verwendet werden
+        """
+        ok = True
         try:
-            if os.path.exists(rule_filename):
-                with open(rule_filename, 'r', encoding='utf-8') as f:
-                    self.rules = yaml.safe_load(f)
-                logger.info(f"Regeln aus {rule_filename} geladen")
-            else:
-                logger.warning(f"Regeldatei {rule_filename} nicht gefunden, verwende leere Regeln")
-                self.rules = {"hosts": {}, "default": [], "sets": {}}
+            rules = read_rule_file(rule_filename)
         except Exception as e:
             logger.error(f"Fehler beim Laden der Regeldatei: {e}")
-            self.rules = {"hosts": {}, "default": [], "sets": {}}
+            rules = empty_rules()
+            ok = False
+        snapshot = RuleSnapshot(rules)
+        snapshot.build_index()
+        with self._lock:
+            self._snapshot = snapshot
+            self.clear_cache()
+        return ok
+
+    def build_host_index(self):
+        """Baut den kompilierten Host-Index aus den aktuellen Regeln auf"""
+        with self._lock:
+            return self._snapshot.build_index()
+
+    def clear_cache(self):
+        """Leert den Ergebnis-Cache, z.B. nachdem sich die Regeln geändert haben"""
+        if self.cache is not None:
+            self.cache.clear()
+
+    def cache_info(self):
+        """Liefert Treffer-/Fehlzähler und Größe des Caches oder None ohne Cache"""
+        if self.cache is None:
+            return None
+        return self.cache.info()
+
+    def cache_key(self, url, mode):
+        """
+        Bildet den kanonischen Cache-Schlüssel einer URL
+
+        Returns:
+            Tupel (Schlüssel, Ursprung der Ausgabe) oder (None, None), wenn die
+            URL nicht gecacht werden kann
+        """
+        parts = split_origin(url)
+        if parts is None:
+            return None, None
+        canonical, origin, rest = parts
+        return f"{mode}\x00{canonical}{rest}", origin
+
+    def get_host_rule(self, host):
+        """
+        Liefert die spezifischste Host-Regel für einen Hostnamen
+
+        Gelernte Hosts werden beim Lernen in den Index eingefügt; nur wenn die
+        Host-Regeln direkt ersetzt oder ergänzt wurden, wird er neu aufgebaut.
+
+        Returns:
+            Die Host-Regel als Dictionary oder None, wenn kein Muster passt
+        """
+        return self._snapshot.lookup(host)
+
+    def build_snapshot(self):
+        """
+        Baut einen neuen Regelstand aus Regeldatei, AdGuard-Regeln und
+        Lern-Journal auf, ohne den veröffentlichten Stand zu verändern
+
+        Raises:
+            OSError oder yaml.YAMLError, falls die Regeldatei nicht lesbar ist
+        """
+        # Hosts können sich über YAML-Anker ein Dictionary teilen; ohne Kopie
+        # landeten zusammengeführte Parameter auch bei den Alias-Hosts
+        rules = copy_rules(read_rule_file(self.rule_file))
+        if self.use_adguard:
+            adguard_rules = load_adguard_rules()
+            if adguard_rules:
+                self.adguard_rules = adguard_rules
+                merge_rules(rules, adguard_rules)
+        if self.journal is not None:
+            for host, params in self.journal.read():
+                merge_params(rules, host, params)
+        snapshot = RuleSnapshot(rules)
+        snapshot.build_index()
+        return snapshot
 
     def reload_rule(self):
-        """Lädt die Regeln neu"""
-        self.load_rule_file(self.rule_file)
+        """
+        Lädt die Regeln neu
+
+        Der neue Stand wird vollständig aufgebaut und dann mit einer einzigen
+        Zuweisung veröffentlicht; laufende Aufrufe beenden ihre Arbeit mit dem
+        bisherigen Stand. Ist die Regeldatei nicht lesbar, bleibt er erhalten.
+
+        Returns:
+            True, wenn neue Regeln veröffentlicht wurden, sonst False
+        """
+        metrics = self.metrics
+        started = time.perf_counter()
+        with self._lock:
+            try:
+                snapshot = self.build_snapshot()
+            except Exception as e:
+                logger.error(f"Fehler beim Neuladen der Regeln, behalte bisherige Regeln: {e}")
+                if metrics is not None:
+                    metrics.inc("rule_reloads_total", result="failed")
+                return False
+            self._snapshot = snapshot
+            self.clear_cache()
+        if metrics is not None:
+            metrics.observe("rules_load_seconds", time.perf_counter() - started)
+            metrics.inc("rule_reloads_total", result="ok")
+        logger.info(f"Regeln aus {self.rule_file} neu geladen")
+        return True
+
+    def watch_rules(self, interval=2.0):
+        """
+        Überwacht die Regeldateien und lädt sie bei Änderungen neu
+
+        Args:
+            interval: Abstand zwischen zwei Prüfungen in Sekunden
+        """
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = RuleWatcher(self.snapshot_sources(), self.reload_rule, interval)
+            self._watcher.start()
+
+    def stop_watching(self):
+        """Beendet die Überwachung der Regeldateien"""
+        with self._lock:
+            watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.stop()
+
+    def replay_journal(self):
+        """Wendet die Einträge des Lern-Journals auf die geladenen Regeln an"""
+        if self.journal is None:
+            return
+        entries = self.journal.read()
+        if entries:
+            with self._lock:
+                self._snapshot = self._snapshot.extend(entries)
+                self.clear_cache()
+        self.journal.entries = len(entries)
+
+    def learn(self, host, remove_list):
+        """
+        Übernimmt im Auto-Modus gelernte Parameter in die Regeln
+
+        Die Regeln werden im Speicher ergänzt und im Journal vermerkt; die
+        Regeldatei wird erst beim Verdichten im Hintergrund neu geschrieben.
+        """
+        with self._lock:
+            self.add_to_rule(host, remove_list)
+            if self.journal is None:
+                self.save_rule()
+                self.reload_rule()
+                return
+            # Unter der Sperre, damit ein gleichzeitiges Neuladen den Eintrag sieht
+            self.journal.append(host, remove_list)
+        if self.journal.entries >= self.compact_every:
+            self.compact_rules(background=True)
+
+    def compact_rules(self, background=False):
+        """
+        Übernimmt das Lern-Journal in die Regeldatei
+
+        Args:
+            background: Verdichten in einem Hintergrund-Thread ausführen
+
+        Returns:
+            Anzahl der übernommenen Einträge (im Hintergrund: None)
+        """
+        if self.journal is None:
+            return 0
+        if not background:
+            return self.journal.compact(self.rule_file)
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return None
+            self._compactor = threading.Thread(target=self._compact_in_background,
+                                               name="clearurl-compact", daemon=True)
+            self._compactor.start()
+        return None
+
+    def _compact_in_background(self):
+        try:
+            self.journal.compact(self.rule_file)
+        except Exception as e:
+            logger.error(f"Fehler beim Verdichten des Lern-Journals: {e}")
 
     def dump_rule_file(self, rule_filename):
         """Speichert die Regeln in einer YAML-Datei"""
         try:
             with open(rule_filename, 'w', encoding='utf-8') as f:
+                import yaml
                 yaml.safe_dump(self.rules, f, sort_keys=False, allow_unicode=True)
             logger.info(f"Regeln in {rule_filename} gespeichert")
         except Exception as e:
@@ -141,40 +561,36 @@ class Filter(object):
 
     def save_rule(self):
         """Speichert die aktuellen Regeln"""
-        self.dump_rule_file(self.rule_file)
+        with self._lock:
+            self.dump_rule_file(self.rule_file)
 
     def add_to_rule(self, host, remove_list):
-        """Fügt neue Parameter zur Regel für einen Host hinzu"""
+        """
+        Fügt neue Parameter zur Regel für einen Host hinzu
+
+        Der ergänzte Stand wird neben dem aktuellen aufgebaut und mit einer
+        einzigen Zuweisung veröffentlicht; gleichzeitige Aufrufe von
+        filter_url lesen nie ein Dictionary, das gerade verändert wird.
+        """
         if not host:
             return
             
-        if self.rules.get('hosts') is None:
-            self.rules['hosts'] = {}
-            
-        if self.rules['hosts'].get(host):
-            existing_list = self.rules['hosts'][host].get('query', [])
-            # Füge neue Parameter hinzu und entferne Duplikate
-            updated_list = list(set(existing_list + remove_list))
-            self.rules['hosts'][host]['query'] = updated_list
-        else:
-            self.rules['hosts'][host] = {"query": remove_list}
+        with self._lock:
+            self._snapshot = self._snapshot.extend([(host, remove_list)])
+            self.clear_cache()
 
     def merge_adguard_rules(self):
         """Führt die AdGuard-Regeln mit den benutzerdefinierten Regeln zusammen"""
         if not self.adguard_rules:
             return
             
-        # Füge die Standard-Parameter hinzu
-        if 'default' in self.adguard_rules:
-            default_set = set(self.rules.get('default', []))
-            default_set.update(self.adguard_rules['default'])
-            self.rules['default'] = list(default_set)
-            
-        # Füge die Host-spezifischen Regeln hinzu
-        if 'hosts' in self.adguard_rules:
-            for host, host_rules in self.adguard_rules['hosts'].items():
-                query_params = host_rules.get('query', [])
-                self.add_to_rule(host, query_params)
+        with self._lock:
+            rules = copy_rules(self.rules)
+            merge_rules(rules, self.adguard_rules)
+            snapshot = RuleSnapshot(rules)
+            snapshot.build_index()
+            self._snapshot = snapshot
+            self.clear_cache()
 
     def filter_url(self, url, mode=None):
         """
@@ -187,133 +603,406 @@ class Filter(object):
         Returns:
             Die gefilterte URL
         """
-        if not url:
+        metrics = self.metrics
+        hooks = self._hooks
+        if metrics is None and not hooks:
+            return self._filter_url(url, mode)
+        if hooks:
+            call_hooks(hooks, "begin", "filter_url", {"url": url, "mode": mode})
+        started = time.perf_counter()
+        result = self._filter_url(url, mode)
+        duration = time.perf_counter() - started
+        if metrics is not None:
+            metrics.observe("filter_seconds", duration, mode=mode or "default")
+            metrics.inc("urls_total", mode=mode or "default")
+        if hooks:
+            call_hooks(hooks, "end", "filter_url",
+                       {"url": url, "mode": mode, "result": result, "changed": result != url, "duration": duration})
+        return result
+
+    def _filter_url(self, url, mode):
+        # URLs ohne Query und Fragment bleiben in jedem Modus unverändert
+        if not url or ("?" not in url and "#" not in url):
             return url
+
+        key = None
+        if self.cache is not None:
+            # Vor dem Lesen der Regeln, damit ein gleichzeitiges Neuladen das
+            # Speichern eines veralteten Ergebnisses verhindert
+            generation = self.cache.generation
+            key, origin = self.cache_key(url, mode)
+            if key is not None:
+                cached = self.cache.get(key)
+                if self.metrics is not None:
+                    self.metrics.inc("cache_hits_total" if cached is not None else "cache_misses_total")
+                if cached is not None:
+                    return origin + cached
             
-        self.url = Url(url)
+        parsed = Url(url)
         
-        if not self.url.host:
+        if not parsed.host:
             return url
 
+        result = self.apply_mode(parsed, mode)
+        if key is not None and result.startswith(origin):
+            self.cache.put(key, result[len(origin):], generation)
+        return result
+
+    def filter_urls(self, urls, mode=None):
+        """
+        Filtert viele URLs in einem Durchlauf
+
+        Die URLs werden nach Host gruppiert, sodass jede Host-Regel pro Aufruf
+        nur einmal aufgelöst wird. URLs ohne Query und Fragment werden ohne
+        Parsen unverändert übernommen.
+
+        Args:
+            urls: Beliebiges Iterable von URLs
+            mode: Der Filtermodus wie bei filter_url
+
+        Returns:
+            Liste der gefilterten URLs in der Reihenfolge der Eingabe
+        """
+        cache = self.cache
+        metrics = self.metrics
+        generation = cache.generation if cache is not None else None
+        results = []
+        groups = {}
+        for url in urls:
+            results.append(url)
+            if not url or ("?" not in url and "#" not in url):
+                continue
+            key = origin = None
+            if cache is not None:
+                key, origin = self.cache_key(url, mode)
+                if key is not None:
+                    cached = cache.get(key)
+                    if metrics is not None:
+                        metrics.inc("cache_hits_total" if cached is not None else "cache_misses_total")
+                    if cached is not None:
+                        results[-1] = origin + cached
+                        continue
+            parsed = Url(url)
+            if not parsed.host:
+                continue
+            groups.setdefault(parsed.host, []).append((len(results) - 1, parsed, key, origin))
+
+        for host, items in groups.items():
+            rule = self.resolve_rule(host)
+            for i, parsed, key, origin in items:
+                result = self.apply_mode(parsed, mode, rule)
+                if key is not None and result.startswith(origin):
+                    cache.put(key, result[len(origin):], generation)
+                results[i] = result
+        if metrics is not None:
+            metrics.inc("urls_total", len(results), mode=mode or "default")
+        return results
+
+    def apply_mode(self, url, mode, rule=None):
+        """Wendet den Filtermodus auf ein Url-Objekt an und gibt das Ergebnis zurück"""
+        if self.metrics is not None or self._hooks:
+            return self._apply_mode_measured(url, mode, rule)
         if mode == "rule":
-            self.filter_by_rule()
+            self.filter_by_rule(url, rule)
         elif mode == "auto":
-            self.filter_auto()
+            self.filter_auto(url)
         elif mode == "full":
-            self.filter_by_rule()
-            self.filter_auto()
+            self.filter_by_rule(url, rule)
+            self.filter_auto(url)
         else:
-            if not self.filter_by_rule():
-                self.filter_auto()
-        return self.url.get_url()
+            if not self.filter_by_rule(url, rule):
+                if self.learning_queue is None:
+                    self.filter_auto(url)
+                elif url.parsed_query:
+                    self.learning_queue.submit(url)
+        return url.get_url()
 
-    def filter_by_rule(self):
+    def _apply_mode_measured(self, url, mode, rule):
+        """Wie apply_mode, meldet aber die einzelnen Schritte an Metriken und Hooks"""
+        metrics = self.metrics
+        stages = StageRecorder(metrics, self._hooks)
+        stages.begin("parse", {"url": url.original_url})
+        query = url.parsed_query
+        stages.end("parse", {"host": url.host, "params": query.keys()})
+        default = mode not in ("rule", "auto", "full")
+        changed = False
+        if mode != "auto":
+            stages.begin("match", {"host": url.host})
+            snapshot = self._snapshot
+            if rule is None:
+                rule = snapshot.resolve(url.host)
+            pattern = snapshot.match(url.host)
+            stages.end("match", {"host": url.host, "rule": pattern})
+            stages.begin("remove")
+            before = query.pairs
+            changed = self.filter_by_rule(url, rule)
+            removed = []
+            if changed:
+                remaining = {p[0] for p in url.parsed_query.pairs}
+                removed = list(dict.fromkeys(p[0] for p in before if p[0] not in remaining))
+            stages.end("remove", {"removed": removed, "changed": changed})
+            if changed and metrics is not None:
+                metrics.inc("rule_hits_total", rule=pattern if pattern is not None else "default")
+                for param in removed:
+                    metrics.inc("params_removed_total", param=param)
+        if mode in ("auto", "full") or (default and not changed and self.learning_queue is None):
+            stages.begin("auto", {"host": url.host})
+            stats = {}
+            self.filter_auto(url, stats)
+            stages.end("auto", {"probes": stats.get("probes", 0), "removed": stats.get("removed", []),
+                                "cached": stats.get("cached", 0)})
+        elif default and not changed and url.parsed_query:
+            self.learning_queue.submit(url)
+        stages.begin("rebuild")
+        result = url.get_url()
+        stages.end("rebuild")
+        return result
+
+    def resolve_rule(self, host):
+        """
+        Ermittelt die anzuwendende, kompilierte Regel für einen Host
+
+        Returns:
+            Tupel aus dem frozenset der zu entfernenden Parameter, der Angabe,
+            ob das Fragment behalten werden soll, dem regulären Ausdruck für
+            "name=wert" (oder None) und dem frozenset der zu behaltenden
+            Parameter (siehe RuleSnapshot.resolve)
+        """
+        # Ein Stand für den gesamten Aufruf, auch wenn parallel neu geladen wird
+        return self._snapshot.resolve(host)
+
+    def filter_by_rule(self, url, rule=None):
         """
         Filtert die URL basierend auf den vordefinierten Regeln
         
+        Args:
+            url: Das zu verändernde Url-Objekt
+            rule: Bereits aufgelöste Regel aus resolve_rule (optional)
+
         Returns:
             True, wenn die URL geändert wurde, sonst False
         """
-        remove_list = []
-        # Standardmäßig Fragment behalten
-        keep_fragment = True
-
-        # Lade hostbasierte Regeln (mit Wildcard-Unterstützung)
-        host_flag = False
-        for host in self.rules.get("hosts", {}):
-            if fnmatch.fnmatch(self.url.host, host):
-                host_flag = True
-                host_rules = self.rules["hosts"].get(host, {})
-                remove_list = host_rules.get("query", [])
-                keep_fragment = host_rules.get("fragment", True)
-                break
-                
-        # Wenn kein Host-Match, verwende Standardregeln
-        if not host_flag:
-            remove_list = self.rules.get("default", [])
-            
-        # Entferne die Parameter aus der URL
-        for k in remove_list:
-            if self.url.query_dict.get(k):
-                self.url.query_dict.pop(k)
+        if rule is None:
+            rule = self.resolve_rule(url.host)
+        remove, keep_fragment, regex, keep = rule
+        changed = False
+
+        # Prüfe die Parameter der URL (meist wenige) gegen die Regel (oft hunderte)
+        if regex is None:
+            changed = url.parsed_query.remove(remove)
+        else:
+            # Zusätzlich Parameter, deren "name=wert" auf ein Muster passt
+            changed = url.parsed_query.remove_matching(remove, regex, keep)
                 
         # Entferne Fragment, falls konfiguriert
-        if not keep_fragment:
-            self.url.fragment = None
+        if not keep_fragment and url.fragment:
+            url.fragment = None
+            changed = True
             
-        # Prüfe, ob die URL geändert wurde
-        if self.url.get_url() == self.url.original_url:
-            return False
+        return changed
+
+    def fetch_page(self, url):
+        """Ruft eine Seite für den Auto-Modus ab und meldet Dauer und Größe an Metriken und Hooks"""
+        # get_url_content wird erst beim Aufruf nachgeschlagen (austauschbar, z.B. in Tests)
+        metrics = self.metrics
+        hooks = self._hooks
+        if metrics is None and not hooks:
+            return get_url_content(url)
+        if hooks:
+            call_hooks(hooks, "begin", "probe", {"url": url})
+        started = time.perf_counter()
+        content = get_url_content(url)
+        duration = time.perf_counter() - started
+        size = len(content or b"")
+        if metrics is not None:
+            metrics.observe("probe_seconds", duration)
+            metrics.inc("probe_fetches_total")
+            metrics.inc("probe_bytes_total", size)
+            if not content:
+                metrics.inc("probe_errors_total")
+        if hooks:
+            call_hooks(hooks, "end", "probe", {"url": url, "bytes": size, "ok": bool(content), "duration": duration})
+        return content
+
+    def add_hook(self, callback):
+        """
+        Registriert einen Callback für Beginn und Ende der Verarbeitungsschritte
+
+        Der Callback wird als callback(phase, stage, info) aufgerufen: phase ist
+        'begin' oder 'end', stage einer der Schritte filter_url, parse, match,
+        remove, auto, probe und rebuild, info ein Dictionary mit Angaben zum
+        Schritt (z.B. das getroffene Host-Muster unter rule, die entfernten
+        Parameter unter removed, beim Ende die Dauer in Sekunden unter
+        duration). Abrufe (probe) werden in den Threads des Probers gemeldet.
+        Ohne registrierte Hooks entstehen keine Zusatzkosten.
+        """
+        with self._lock:
+            self._hooks = self._hooks + (callback,)
+
+    def remove_hook(self, callback):
+        """Entfernt einen mit add_hook registrierten Callback"""
+        with self._lock:
+            self._hooks = tuple(h for h in self._hooks if h != callback)
+
+    def variant_url(self, url, keys):
+        """Erstellt die URL ohne die angegebenen Parameter"""
+        select_url = url.copy()
+        select_url.parsed_query.remove(set(keys))
+        return select_url.get_url()
+
+    def probe_params(self, url, params):
+        """
+        Ermittelt durch Abrufe, welche Parameter die Seite nicht verändern
+
+        Jede Runde ruft alle offenen Gruppen gleichzeitig ab. Bei der Strategie
+        'single' ist jede Gruppe ein einzelner Parameter, bei 'group' beginnt
+        die Suche mit allen Parametern und halbiert nur Gruppen, deren Entfernen
+        die Seite verändert. Die Gesamtfrist und max_probes gelten über alle
+        Runden; nicht geprüfte Parameter bleiben erhalten.
+
+        Returns:
+            Tupel (Liste entfernbarer Parameter oder None, wenn die ursprüngliche
+            Seite nicht abrufbar ist, Liste der nachweislich notwendigen
+            Parameter, Anzahl der Abrufe)
+        """
+        if self.probe_strategy == "group":
+            groups = [params]
         else:
-            return True
+            groups = [[k] for k in params]
+        expires = time.monotonic() + self.prober.deadline
+        engine = self.similarity
+        original = None
+        remove_list = []
+        required = []
+        probes = 0
+
+        while groups:
+            probe_urls = [url.get_url()] if original is None else []
+            if self.max_probes is not None:
+                groups = groups[:max(self.max_probes - probes - len(probe_urls), 0)]
+            remaining = expires - time.monotonic()
+            if remaining <= 0 or not groups:
+                break
+            probe_urls.extend(self.variant_url(url, g) for g in groups)
+            contents = self.prober.fetch_all(probe_urls, remaining)
+            probes += len(probe_urls)
+            if self.metrics is not None and None in contents:
+                self.metrics.inc("probe_timeouts_total", contents.count(None))
 
-    def filter_auto(self):
+            if original is None:
+                original_content = contents.pop(0)
+                if not original_content:
+                    logger.warning(f"Inhalt von {probe_urls[0]} nicht abrufbar, Auto-Modus übersprungen")
+                    return None, required, probes
+                # Der Fingerabdruck des Originals wird für alle Vergleiche wiederverwendet
+                original = engine.fingerprint(original_content)
+
+            next_groups = []
+            for group, select_content in zip(groups, contents):
+                # Nicht (rechtzeitig) abrufbare Varianten behalten ihre Parameter
+                if select_content is None:
+                    continue
+                
+                # Wenn die Seiten ähnlich genug sind, sind die Parameter nicht notwendig
+                # Der Standard-Schwellenwert von 0.95 erfordert eine sehr hohe Ähnlichkeit
+                similarity = engine.similarity(original, engine.fingerprint(select_content))
+                if similarity > self.similarity_threshold:
+                    remove_list.extend(group)
+                elif len(group) > 1:
+                    half = len(group) // 2
+                    next_groups.extend((group[:half], group[half:]))
+                else:
+                    required.extend(group)
+            groups = next_groups
+        return remove_list, required, probes
+
+    def filter_auto(self, url, stats=None):
         """
         Versucht automatisch unnötige Parameter zu erkennen und zu entfernen
         
+        Args:
+            url: Das zu verändernde Url-Objekt
+            stats: Optionales Dictionary, in das die Anzahl der Abrufe
+                   ("probes"), die entfernten Parameter ("removed") und die
+                   Anzahl der aus dem Urteilsspeicher entschiedenen Parameter
+                   ("cached") geschrieben werden
+
         Returns:
             True, wenn die URL geändert wurde, sonst False
         """
         try:
-            # Hole den Inhalt der ursprünglichen URL
-            original_content = get_url_content(self.url.get_url())
-            differ = SequenceMatcher()
-            differ.set_seq1(original_content)
+            params = url.parsed_query.keys()
+            if not params:
+                return False
             
-            # Prüfe jeden Parameter einzeln
-            remove_list = []
-            for k in list(self.url.query_dict.keys()):
-                # Erstelle eine URL ohne diesen Parameter
-                select_query_dict = self.url.query_dict.copy()
-                select_query_dict.pop(k)
-                select_url = self.url.copy()
-                select_url.query_dict = select_query_dict
-                
-                # Hole den Inhalt der modifizierten URL
-                select_content = get_url_content(select_url.get_url())
-                differ.set_seq2(select_content)
-                
-                # Wenn die Seiten ähnlich genug sind, ist der Parameter nicht notwendig
-                # Ein Schwellenwert von 0.95 erfordert eine sehr hohe Ähnlichkeit
-                if differ.ratio() > 0.95:
-                    remove_list.append(k)
+            # Bekannte Urteile ersparen die Abrufe für diese Parameter
+            known = self.verdicts.get_many(url.host, params) if self.verdicts else {}
+            known_removable = [k for k in params if known.get(k) == REMOVABLE]
+            url.parsed_query.remove(set(known_removable))
+            unknown = [k for k in params if k not in known]
+            
+            learned, probes = [], 0
+            if unknown:
+                learned, required, probes = self.probe_params(url, unknown)
+                if learned is not None and self.verdicts:
+                    verdicts = dict.fromkeys(required, REQUIRED)
+                    verdicts.update(dict.fromkeys(learned, REMOVABLE))
+                    self.verdicts.put_many(url.host, verdicts)
+            learned = learned or []
+            remove_list = known_removable + learned
+            
+            with self._stats_lock:
+                self.probe_stats["urls"] += 1
+                self.probe_stats["probes"] += probes
+            if stats is not None:
+                stats["probes"] = probes
+                stats["removed"] = list(remove_list)
+                stats["cached"] = len(known)
+            logger.debug(f"Auto-Modus für {url.host}: {probes} Abrufe für {len(params)} Parameter")
                     
             # Entferne die identifizierten Parameter
-            for k in remove_list:
-                if k in self.url.query_dict:
-                    self.url.query_dict.pop(k)
+            url.parsed_query.remove(set(learned))
                 
             # Lerne neue Regeln, falls aktiviert
-            if self.study and remove_list:
-                self.add_to_rule(self.url.host, remove_list)
-                self.save_rule()
-                self.reload_rule()
+            if self.study and learned:
+                self.learn(url.host, learned)
                 
-            # Prüfe, ob die URL geändert wurde
-            if self.url.get_url() == self.url.original_url:
-                return False
-            else:
-                return True
+            return bool(remove_list)
         except Exception as e:
             logger.error(f"Fehler im Auto-Filter-Modus: {e}")
             return False
 
 
-def get_url_content(url):
+def get_session():
+    """Liefert die gemeinsame HTTP-Session mit Verbindungspool"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests wird erst beim ersten Abruf geladen
+            import requests
+            import requests.adapters
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            _session = session
+        return _session
+
+
+def get_url_content(url, timeout=10):
     """
     Ruft den Inhalt einer URL ab
     
     Args:
         url: Die URL, deren Inhalt abgerufen werden soll
+        timeout: Zeitlimit für die Anfrage in Sekunden
         
     Returns:
         Der Inhalt der URL als Bytes
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = get_session().get(url, timeout=timeout)
         return resp.content
     except Exception as e:
         logger.error(f"Fehler beim Abrufen der URL {url}: {e}")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import re
+from bisect import insort
+
+# Zeichen, die ein Host-Muster zu einem echten Glob-Muster machen
+GLOB_CHARS = re.compile(r'[*?\[\]]')
+
+# Schlüssel für Einträge in einem Trie-Knoten (Labels enthalten nie Leerzeichen)
+EXACT = " exact"
+WILDCARD = " wildcard"
+
+
+def compile_glob(pattern):
+    """Kompiliert ein Glob-Muster (fnmatch wird nur bei Bedarf geladen)"""
+    from fnmatch import translate
+    return re.compile(translate(pattern))
+
+
+class HostIndex(object):
+    """
+    Kompilierter Index über die Host-Muster der Regeln
+
+    Exakte Hosts und Muster der Form "*.domain" landen in einem Suffix-Trie
+    über die umgekehrten Labels ("www.example.com" -> com, example, www).
+    Alle übrigen Glob-Muster kommen in eine kleine Fallback-Liste, die mit
+    vorkompilierten regulären Ausdrücken geprüft wird. Die Kosten einer
+    Abfrage hängen damit von der Länge des Hostnamens ab und nicht von der
+    Anzahl der Host-Regeln.
+    """
+    def __init__(self, patterns=()):
+        self.trie = {}
+        self.globs = []
+        self.size = 0
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern):
+        """Fügt ein Host-Muster aus den Regeln zum Index hinzu"""
+        self._add(pattern, None)
+
+    def extended(self, patterns):
+        """
+        Liefert einen neuen Index mit zusätzlichen Host-Mustern
+
+        Dieser Index bleibt unverändert und kann währenddessen weiter gelesen
+        werden. Kopiert werden nur die Trie-Knoten entlang der neuen Pfade;
+        alle übrigen Teilbäume teilen sich beide Indizes.
+        """
+        index = HostIndex()
+        index.trie = dict(self.trie)
+        index.globs = list(self.globs)
+        index.size = self.size
+        copied = {id(index.trie)}
+        for pattern in patterns:
+            index._add(pattern, copied)
+        return index
+
+    def _add(self, pattern, copied):
+        if not pattern:
+            return
+        self.size += 1
+        if pattern.startswith("*.") and not GLOB_CHARS.search(pattern[2:]):
+            self._insert(pattern[2:], WILDCARD, pattern, copied)
+        elif not GLOB_CHARS.search(pattern):
+            self._insert(pattern, EXACT, pattern, copied)
+        else:
+            regex = compile_glob(pattern)
+            # Spezifität: Anzahl der festen (Nicht-Glob-)Zeichen im Muster
+            literal = len(GLOB_CHARS.sub("", pattern))
+            insort(self.globs, (-literal, pattern, regex))
+
+    def to_state(self):
+        """Liefert den Index als Struktur aus Basistypen (z.B. für marshal)"""
+        return {
+            "trie": self.trie,
+            "globs": [(neg_literal, pattern) for neg_literal, pattern, _ in self.globs],
+            "size": self.size,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Stellt einen Index aus dem Ergebnis von to_state wieder her"""
+        index = cls()
+        index.trie = state["trie"]
+        index.globs = [(neg_literal, pattern, compile_glob(pattern))
+                       for neg_literal, pattern in state["globs"]]
+        index.size = state["size"]
+        return index
+
+    def _insert(self, domain, kind, pattern, copied=None):
+        # copied enthält die ids der bereits kopierten Knoten (None = direkt ändern)
+        node = self.trie
+        for label in reversed(domain.split(".")):
+            child = node.get(label)
+            if child is None:
+                child = node[label] = {}
+                if copied is not None:
+                    copied.add(id(child))
+            elif copied is not None and id(child) not in copied:
+                child = node[label] = dict(child)
+                copied.add(id(child))
+            node = child
+        node[kind] = pattern
+
+    def lookup(self, host):
+        """
+        Sucht die spezifischste passende Host-Regel
+
+        Ein exakter Treffer gewinnt immer, danach das "*.domain"-Muster mit
+        dem längsten Suffix. Glob-Muster aus der Fallback-Liste werden nur
+        vorgezogen, wenn sie mehr feste Zeichen enthalten.
+
+        Args:
+            host: Der Hostname der URL
+
+        Returns:
+            Das passende Muster aus den Regeln oder None
+        """
+        if not host:
+            return None
+
+        best = None
+        best_literal = -1
+        labels = host.split(".")
+        node = self.trie
+        remaining = len(labels)
+        for label in reversed(labels):
+            node = node.get(label)
+            if node is None:
+                break
+            remaining -= 1
+            if remaining == 0:
+                if EXACT in node:
+                    return node[EXACT]
+            elif WILDCARD in node:
+                best = node[WILDCARD]
+                best_literal = len(best) - 1
+
+        for neg_literal, pattern, regex in self.globs:
+            # Die Liste ist absteigend nach Spezifität sortiert
+            if -neg_literal <= best_literal:
+                break
+            if regex.match(host):
+                return pattern
+        return best
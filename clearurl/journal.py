@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import os
+import json
+import time
+import atexit
+import weakref
+import threading
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger('clearurl.journal')
+
+# Offene Journale; ein einziger atexit-Hook synchronisiert sie beim Beenden,
+# ohne sie am Leben zu halten
+_journals = weakref.WeakSet()
+
+
+def _sync_all():
+    for journal in list(_journals):
+        try:
+            journal.sync()
+        except Exception as e:
+            logger.error(f"Fehler beim Synchronisieren von {journal.path}: {e}")
+
+
+atexit.register(_sync_all)
+
+
+@contextmanager
+def locked(f):
+    """Hält eine exklusive Dateisperre (prozessübergreifend, sofern verfügbar)"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield f
+    finally:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def merge_params(rules, host, params):
+    """
+    Ergänzt die Parameter einer Host-Regel in einem Regel-Dictionary
+
+    Die Host-Regel wird durch eine Kopie ersetzt, da sich mehrere Hosts über
+    YAML-Anker ein Dictionary teilen können.
+    """
+    if rules.get('hosts') is None:
+        rules['hosts'] = {}
+    host_rules = rules['hosts'].get(host)
+    if host_rules:
+        existing = host_rules.get('query') or []
+        rules['hosts'][host] = dict(host_rules, query=list(dict.fromkeys(existing + list(params))))
+    else:
+        rules['hosts'][host] = {"query": list(params)}
+
+
+class RuleJournal(object):
+    """
+    Append-only-Journal für gelernte Regeln
+
+    Jede gelernte Regel wird als JSON-Zeile angehängt, statt die gesamte
+    Regeldatei neu zu schreiben. Schreibzugriffe sind über eine Dateisperre
+    gegen andere Prozesse abgesichert; fsync erfolgt gebündelt. Beim Verdichten
+    werden die Einträge in die Regeldatei übernommen und das Journal geleert.
+    """
+    def __init__(self, path, sync_every=32, sync_interval=1.0):
+        """
+        Args:
+            path: Pfad zur Journal-Datei
+            sync_every: fsync spätestens nach so vielen Einträgen
+            sync_interval: fsync spätestens nach so vielen Sekunden
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.entries = 0
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        _journals.add(self)
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, host, params):
+        """Hängt eine gelernte Regel an das Journal an"""
+        line = json.dumps({"host": host, "query": list(params)}, ensure_ascii=False) + "\n"
+        with self._lock:
+            f = self._open()
+            with locked(f):
+                f.write(line)
+                f.flush()
+            self.entries += 1
+            self._pending += 1
+            if (self._pending >= self.sync_every
+                    or time.monotonic() - self._last_sync >= self.sync_interval):
+                self._sync_locked()
+
+    def _sync_locked(self):
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Schreibt alle angehängten Einträge dauerhaft auf die Festplatte"""
+        with self._lock:
+            self._sync_locked()
+
+    def read(self):
+        """
+        Liest alle Einträge des Journals
+
+        Returns:
+            Liste von Tupeln (Host, Parameterliste); beschädigte Zeilen, etwa
+            von einem abgebrochenen Schreibvorgang, werden übersprungen
+        """
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        entries.append((entry["host"], entry["query"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def compact(self, rule_file):
+        """
+        Übernimmt alle Einträge in die Regeldatei und leert das Journal
+
+        Die Regeldatei wird frisch gelesen (ohne zusammengeführte AdGuard-Regeln)
+        und atomar ersetzt. Während des Verdichtens blockiert die Dateisperre
+        das Anhängen durch andere Prozesse, sodass kein Eintrag verloren geht.
+
+        Returns:
+            Anzahl der übernommenen Einträge
+        """
+        if not os.path.exists(self.path):
+            return 0
+        import yaml
+        with self._lock, open(self.path, 'r+', encoding='utf-8') as journal, locked(journal):
+            entries = []
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                    entries.append((entry["host"], entry["query"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+            if not entries:
+                return 0
+
+            rules = {}
+            if os.path.exists(rule_file):
+                with open(rule_file, 'r', encoding='utf-8') as f:
+                    rules = yaml.safe_load(f) or {}
+            for host, params in entries:
+                merge_params(rules, host, params)
+
+            tmp_path = f"{rule_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                yaml.safe_dump(rules, f, sort_keys=False, allow_unicode=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, rule_file)
+
+            journal.seek(0)
+            journal.truncate()
+            journal.flush()
+            os.fsync(journal.fileno())
+            self.entries = 0
+        logger.info(f"{len(entries)} gelernte Regeln in {rule_file} übernommen")
+        return len(entries)
+
+    def close(self):
+        """Synchronisiert und schließt das Journal"""
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        _journals.discard(self)
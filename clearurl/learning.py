@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import queue
+import threading
+import logging
+
+logger = logging.getLogger('clearurl.learning')
+
+# Signal zum Beenden eines Worker-Threads
+_STOP = object()
+
+
+class LearningQueue(object):
+    """
+    Begrenzte Warteschlange für die Auto-Erkennung im Hintergrund
+
+    URLs, bei denen die Regeln nichts entfernt haben, werden hier abgelegt
+    und von Worker-Threads mit Filter.filter_auto geprüft. Gelerntes landet
+    über die Selbstlernfunktion in den Regeln und gilt für spätere Aufrufe.
+    Gleichartige URLs (gleicher Host, gleiche Parameternamen) werden nur
+    einmal eingereiht; ist die Warteschlange voll, wird die URL verworfen.
+    """
+    def __init__(self, filter, workers=2, maxsize=1000):
+        """
+        Args:
+            filter: Der Filter, dessen Regeln verbessert werden
+            workers: Anzahl der Worker-Threads
+            maxsize: Maximale Anzahl wartender URLs
+        """
+        self.filter = filter
+        self.stats = {"queued": 0, "duplicates": 0, "dropped": 0, "processed": 0}
+        self._queue = queue.Queue(maxsize)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name=f"clearurl-learn-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, url):
+        """
+        Reiht ein Url-Objekt zur Prüfung im Hintergrund ein
+
+        Returns:
+            True, wenn die URL eingereiht wurde, sonst False
+        """
+        key = (url.host, frozenset(url.parsed_query.keys()))
+        with self._lock:
+            if key in self._pending:
+                self.stats["duplicates"] += 1
+                return False
+            try:
+                self._queue.put_nowait((key, url.original_url))
+            except queue.Full:
+                self.stats["dropped"] += 1
+                return False
+            self._pending.add(key)
+            self.stats["queued"] += 1
+        return True
+
+    def _work(self):
+        from .clearurl import Url
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                key, url = item
+                try:
+                    self.filter.filter_auto(Url(url))
+                except Exception as e:
+                    logger.error(f"Fehler bei der Hintergrund-Erkennung für {url}: {e}")
+                with self._lock:
+                    self._pending.discard(key)
+                    self.stats["processed"] += 1
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Wartet, bis alle eingereihten URLs geprüft wurden"""
+        self._queue.join()
+
+    def close(self):
+        """Beendet die Worker-Threads, nachdem die Warteschlange abgearbeitet ist"""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import threading
+from bisect import bisect_left
+
+# Obergrenzen der Histogramm-Buckets in Sekunden (1 µs bis 10 s)
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value):
+    """Maskiert einen Label-Wert für das Prometheus-Textformat"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram(object):
+    """Histogramm mit festen Buckets, Summe und Anzahl der Beobachtungen"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Liefert die kumulierten Anzahlen je Obergrenze (letzte: +Inf)"""
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class MetricsRegistry(object):
+    """
+    Sammelt Zähler und Latenz-Histogramme
+
+    Ein Filter schreibt nur dann Metriken, wenn ihm eine Registry übergeben
+    wurde; ohne Registry kostet die Instrumentierung lediglich eine Abfrage
+    auf None. Labels werden als Schlüsselwortargumente angegeben. Alle
+    Methoden sind thread-sicher.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="clearurl"):
+        """
+        Args:
+            buckets: Obergrenzen der Histogramm-Buckets in Sekunden
+            prefix: Präfix der Metriknamen im Prometheus-Format
+        """
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Erhöht einen Zähler"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Trägt einen Messwert (z.B. eine Dauer in Sekunden) in ein Histogramm ein"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def get(self, name, **labels):
+        """Liefert den Wert eines Zählers (0, falls noch nicht gezählt)"""
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def reset(self):
+        """Verwirft alle Messwerte"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_dict(self):
+        """
+        Liefert alle Metriken als JSON-taugliches Dictionary
+
+        Returns:
+            {"counters": {Name: [{"labels": ..., "value": ...}]},
+             "histograms": {Name: [{"labels": ..., "count": ..., "sum": ...,
+                                    "buckets": {Obergrenze: kumulierte Anzahl}}]}}
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, h.count, h.sum, h.cumulative()) for key, h in sorted(self._histograms.items())]
+        result = {"counters": {}, "histograms": {}}
+        for (name, labels), value in counters:
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), count, total, cumulative in histograms:
+            bounds = [repr(b) for b in self.buckets] + ["+Inf"]
+            result["histograms"].setdefault(name, []).append({
+                "labels": dict(labels),
+                "count": count,
+                "sum": total,
+                "buckets": dict(zip(bounds, cumulative)),
+            })
+        return result
+
+    def to_prometheus(self):
+        """Liefert alle Metriken im Prometheus-Textformat"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, h.count, h.sum, h.cumulative()) for key, h in sorted(self._histograms.items())]
+        lines = []
+        last = None
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}"
+            if name != last:
+                lines.append(f"# TYPE {metric} counter")
+                last = name
+            lines.append(f"{metric}{format_labels(labels)} {value}")
+        last = None
+        for (name, labels), count, total, cumulative in histograms:
+            metric = f"{self.prefix}_{name}"
+            if name != last:
+                lines.append(f"# TYPE {metric} histogram")
+                last = name
+            bounds = [repr(b) for b in self.buckets] + ["+Inf"]
+            for bound, value in zip(bounds, cumulative):
+                lines.append(f"{metric}_bucket{format_labels(labels, [('le', bound)])} {value}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .clearurl import Filter
+from .stream import chunked
+
+# Filter des aktuellen Worker-Prozesses (wird einmal pro Prozess erzeugt)
+_worker_filter = None
+
+
+def _init_worker(filter_kwargs):
+    """Erzeugt den Filter eines Worker-Prozesses, falls er nicht geerbt wurde"""
+    global _worker_filter
+    if _worker_filter is None:
+        _worker_filter = Filter(**filter_kwargs)
+
+
+def _filter_chunk(chunk, mode):
+    return _worker_filter.filter_urls(chunk, mode=mode)
+
+
+def iter_filtered_chunks(urls, workers=None, mode=None, chunk_size=1000, filter=None, **filter_kwargs):
+    """
+    Filtert URLs blockweise in einem Prozess-Pool
+
+    Jeder Worker lädt die Regeln genau einmal. Wird ein bereits geladener
+    Filter übergeben und startet das Betriebssystem Prozesse per fork, erben
+    die Worker dessen Regeln direkt, ohne sie erneut zu laden. Laufen im
+    Prozess bereits Threads (z.B. Hintergrund-Erkennung oder Regelüberwachung),
+    wird nicht geforkt: Die Threads fehlten in den Workern, und von ihnen
+    gehaltene Sperren blieben dort für immer belegt. Die Worker starten dann
+    per forkserver bzw. spawn und laden die Regeln selbst. Es sind nie
+    mehr als zwei Blöcke pro Worker gleichzeitig in Arbeit, sodass der
+    Speicherverbrauch auch bei unendlichen Eingaben konstant bleibt.
+
+    Args:
+        urls: Iterable von URLs
+        workers: Anzahl der Prozesse (Standard: Anzahl der CPU-Kerne)
+        mode: Der Filtermodus wie bei Filter.filter_url
+        chunk_size: Anzahl der URLs pro Block
+        filter: Optional ein bereits geladener Filter zum Teilen mit den Workern
+        **filter_kwargs: Argumente für Filter(), falls Worker ihn selbst erzeugen
+
+    Yields:
+        Tupel (Block der Eingabe, gefilterter Block) in Eingabereihenfolge
+
+    Raises:
+        ValueError: bei deferred_learning oder watch_interval für die Worker,
+                    deren Hintergrund-Threads mit dem Worker verloren gingen
+    """
+    global _worker_filter
+    workers = workers or os.cpu_count() or 1
+    if filter_kwargs.get("deferred_learning") or filter_kwargs.get("watch_interval"):
+        raise ValueError("deferred_learning und watch_interval sind in Worker-Prozessen nicht möglich")
+    # Die Worker prüfen nicht noch einmal auf AdGuard-Updates
+    filter_kwargs.setdefault("auto_update", False)
+
+    context = None
+    inherit = False
+    if multiprocessing.get_start_method() == "fork":
+        if threading.active_count() > 1:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        else:
+            inherit = filter is not None
+    if inherit:
+        _worker_filter = filter
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(filter_kwargs,)) as pool:
+            pending = deque()
+            for chunk in chunked(urls, chunk_size):
+                pending.append((chunk, pool.submit(_filter_chunk, chunk, mode)))
+                if len(pending) >= workers * 2:
+                    chunk, future = pending.popleft()
+                    yield chunk, future.result()
+            while pending:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+    finally:
+        if inherit:
+            _worker_filter = None
+
+
+def filter_urls_parallel(urls, workers=None, mode=None, chunk_size=1000, filter=None, **filter_kwargs):
+    """
+    Filtert viele URLs auf mehreren CPU-Kernen
+
+    Returns:
+        Liste der gefilterten URLs in der Reihenfolge der Eingabe
+    """
+    results = []
+    for _, cleaned in iter_filtered_chunks(urls, workers, mode, chunk_size, filter, **filter_kwargs):
+        results.extend(cleaned)
+    return results
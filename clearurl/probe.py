@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import time
+import threading
+import logging
+from urllib.parse import urlparse
+
+logger = logging.getLogger('clearurl.probe')
+
+# Obergrenze für die Zahl der Hosts mit eigener Begrenzung
+MAX_TRACKED_HOSTS = 10000
+
+
+class Prober(object):
+    """
+    Ruft mehrere URL-Varianten gleichzeitig ab
+
+    Die Abrufe laufen in einem gemeinsamen Thread-Pool, pro Host ist die Zahl
+    gleichzeitiger Anfragen begrenzt und für jeden Aufruf von fetch_all gilt
+    eine Gesamtfrist. Ein Prober kann von mehreren Threads gleichzeitig
+    verwendet werden.
+    """
+    def __init__(self, fetch, max_workers=8, per_host=4, deadline=30.0):
+        """
+        Args:
+            fetch: Funktion, die eine URL abruft und den Inhalt als Bytes liefert
+            max_workers: Anzahl paralleler Abrufe insgesamt
+            per_host: Maximale Anzahl gleichzeitiger Abrufe pro Host
+            deadline: Gesamtfrist in Sekunden für einen Aufruf von fetch_all
+        """
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.deadline = deadline
+        self._executor = None
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="clearurl-probe")
+            return self._executor
+
+    def _host_limit(self, url):
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            limit = self._host_limits.get(host)
+            if limit is None:
+                if len(self._host_limits) >= MAX_TRACKED_HOSTS:
+                    self._host_limits.clear()
+                limit = self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return limit
+
+    def _fetch_limited(self, url, limit, expires):
+        with limit:
+            # Abrufe, die erst nach Ablauf der Frist starten würden, entfallen
+            if time.monotonic() >= expires:
+                return None
+            return self.fetch(url)
+
+    def fetch_all(self, urls, deadline=None):
+        """
+        Ruft alle URLs gleichzeitig ab
+
+        Args:
+            urls: Liste von URLs
+            deadline: Frist in Sekunden für diesen Aufruf (Standard: self.deadline)
+
+        Returns:
+            Liste der Inhalte in derselben Reihenfolge; None für Abrufe, die
+            innerhalb der Frist nicht abgeschlossen wurden oder fehlschlugen
+        """
+        if deadline is None:
+            deadline = self.deadline
+        expires = time.monotonic() + deadline
+        executor = self._get_executor()
+        futures = [executor.submit(self._fetch_limited, u, self._host_limit(u), expires) for u in urls]
+        from concurrent.futures import wait
+        wait(futures, timeout=deadline)
+
+        results = []
+        for url, future in zip(urls, futures):
+            if not future.done():
+                future.cancel()
+                logger.warning(f"Frist beim Abrufen von {url} überschritten")
+                results.append(None)
+            elif future.exception() is not None:
+                logger.error(f"Fehler beim Abrufen der URL {url}: {future.exception()}")
+                results.append(None)
+            else:
+                results.append(future.result())
+        return results
+
+    def close(self):
+        """Beendet den Thread-Pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
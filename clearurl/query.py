@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+from urllib.parse import unquote_plus
+
+
+def decode(part):
+    """Dekodiert einen Schlüssel oder Wert wie parse_qs, aber nur wenn nötig"""
+    if '%' in part or '+' in part:
+        return unquote_plus(part)
+    return part
+
+
+def tokenize(raw):
+    """
+    Zerlegt einen rohen Query-String in Paare
+
+    Returns:
+        Liste von Tupeln (dekodierter Schlüssel, Anfang, Ende, Position des
+        '=' oder -1) mit den Positionen im rohen String
+    """
+    if not raw:
+        return []
+    pairs = []
+    start = 0
+    for part in raw.split('&'):
+        end = start + len(part)
+        eq = part.find('=')
+        key = part if eq == -1 else part[:eq]
+        pairs.append((decode(key), start, end, -1 if eq == -1 else start + eq))
+        start = end + 1
+    return pairs
+
+
+class Query(object):
+    """
+    Query-String als Folge von Spans im Original
+
+    Der rohe String wird einmal zerlegt. Beim Entfernen werden nur die
+    betroffenen Paare ausgeschnitten; Kodierung, Reihenfolge, wiederholte und
+    leere Parameter der übrigen Paare bleiben Byte für Byte erhalten. Ohne
+    Änderung liefert to_string den ursprünglichen String zurück.
+    """
+    __slots__ = ("raw", "pairs", "changed")
+
+    def __init__(self, raw):
+        self.raw = raw or ""
+        self.pairs = tokenize(self.raw)
+        self.changed = False
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __contains__(self, key):
+        return any(p[0] == key for p in self.pairs)
+
+    def keys(self):
+        """Liefert die Schlüssel in der Reihenfolge ihres ersten Auftretens (ohne leere Schlüssel)"""
+        return list(dict.fromkeys(p[0] for p in self.pairs if p[0]))
+
+    def value(self, pair):
+        """Liefert den dekodierten Wert eines Paares"""
+        _, start, end, eq = pair
+        return "" if eq == -1 else decode(self.raw[eq + 1:end])
+
+    def items(self):
+        """Liefert alle Paare als (Schlüssel, Wert) mit dekodierten Werten"""
+        return [(p[0], self.value(p)) for p in self.pairs]
+
+    def remove(self, keys):
+        """
+        Entfernt alle Paare, deren Schlüssel in keys enthalten ist
+
+        Returns:
+            True, wenn mindestens ein Paar entfernt wurde
+        """
+        pairs = self.pairs
+        for p in pairs:
+            if p[0] in keys:
+                break
+        else:
+            return False
+        self.pairs = [p for p in pairs if p[0] not in keys]
+        self.changed = True
+        return True
+
+    def remove_matching(self, keys, regex, keep=()):
+        """
+        Entfernt Paare, deren Schlüssel in keys enthalten ist oder deren
+        "name=wert" auf den regulären Ausdruck passt (außer Schlüssel in keep)
+
+        Returns:
+            True, wenn mindestens ein Paar entfernt wurde
+        """
+        kept = [p for p in self.pairs
+                if p[0] not in keys and (p[0] in keep or not regex.search(f"{p[0]}={self.value(p)}"))]
+        if len(kept) == len(self.pairs):
+            return False
+        self.pairs = kept
+        self.changed = True
+        return True
+
+    def copy(self):
+        """Erstellt eine Kopie, deren Paare unabhängig verändert werden können"""
+        clone = Query.__new__(Query)
+        clone.raw = self.raw
+        clone.pairs = list(self.pairs)
+        clone.changed = self.changed
+        return clone
+
+    def to_string(self):
+        """Setzt den Query-String aus den verbliebenen Paaren zusammen"""
+        if not self.changed:
+            return self.raw
+        raw = self.raw
+        return "&".join(raw[start:end] for _, start, end, _ in self.pairs)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import os
+import re
+import threading
+import logging
+from functools import lru_cache
+
+from .hostindex import HostIndex
+from .journal import merge_params
+
+logger = logging.getLogger('clearurl.ruleset')
+
+# Präfix, mit dem ein Eintrag einer Parameterliste auf einen Eintrag aus sets verweist
+SET_PREFIX = "@"
+
+
+def empty_rules():
+    """Liefert leere Regeln"""
+    return {"hosts": {}, "default": [], "sets": {}}
+
+
+def read_rule_file(path):
+    """
+    Lädt Regeln aus einer YAML-Datei
+
+    Returns:
+        Das Regel-Dictionary; leere Regeln, falls die Datei nicht existiert
+
+    Raises:
+        OSError oder yaml.YAMLError, falls die Datei nicht lesbar ist
+    """
+    if not os.path.exists(path):
+        logger.warning(f"Regeldatei {path} nicht gefunden, verwende leere Regeln")
+        return empty_rules()
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = yaml.safe_load(f)
+    logger.info(f"Regeln aus {path} geladen")
+    return rules or empty_rules()
+
+
+def _join_patterns(patterns):
+    return "|".join(f"(?:{p})" for p in patterns)
+
+
+@lru_cache(maxsize=4096)
+def compile_param_patterns(patterns):
+    """
+    Fasst die Parameter-Muster einer Regel zu einem regulären Ausdruck zusammen
+
+    Ungültige Muster (auch solche, die erst zusammengefasst scheitern, etwa
+    wegen doppelter Gruppennamen) werden protokolliert und ignoriert.
+
+    Returns:
+        Den kompilierten Ausdruck oder None, wenn kein gültiges Muster bleibt
+    """
+    try:
+        return re.compile(_join_patterns(patterns))
+    except re.error:
+        pass
+    valid = []
+    for pattern in patterns:
+        try:
+            re.compile(_join_patterns(valid + [pattern]))
+        except re.error as e:
+            logger.warning(f"Ungültiges Parameter-Muster wird ignoriert: {pattern!r} ({e})")
+            continue
+        valid.append(pattern)
+    return re.compile(_join_patterns(valid)) if valid else None
+
+
+def expand_params(params, sets, seen=()):
+    """
+    Löst Verweise auf Parameter-Sets (z.B. "@common-tracking") auf
+
+    Ein Set ist eine Liste oder ein Dictionary mit dem Schlüssel list (wie sie
+    der AdGuard-Updater schreibt) und darf selbst auf andere Sets verweisen.
+    Unbekannte und zyklische Verweise werden ignoriert.
+
+    Returns:
+        Menge der Parameternamen
+    """
+    result = set()
+    for param in params or ():
+        if not isinstance(param, str) or not param.startswith(SET_PREFIX):
+            result.add(param)
+            continue
+        name = param[len(SET_PREFIX):]
+        members = (sets or {}).get(name)
+        if isinstance(members, dict):
+            members = members.get("list")
+        if members is None or name in seen:
+            logger.warning(f"Unbekanntes oder zyklisches Parameter-Set: {name}")
+            continue
+        result |= expand_params(members, sets, seen + (name,))
+    return result
+
+
+def copy_rules(rules):
+    """
+    Kopiert ein Regel-Dictionary so weit, dass merge_rules die Kopie ändern
+    kann, ohne das Original zu verändern
+    """
+    rules = dict(rules)
+    rules['hosts'] = {host: dict(host_rules or {}) for host, host_rules in (rules.get('hosts') or {}).items()}
+    if rules.get('sets') is not None:
+        rules['sets'] = dict(rules['sets'])
+    return rules
+
+
+def merge_rules(rules, extra):
+    """Führt zusätzliche Regeln (z.B. AdGuard-Regeln) in ein Regel-Dictionary ein"""
+    if rules.get('hosts') is None:
+        rules['hosts'] = {}
+    # Füge die Standard-Parameter und -Muster hinzu
+    for key in ('default', 'default_regex'):
+        if extra.get(key):
+            merged = dict.fromkeys(rules.get(key) or [])
+            merged.update(dict.fromkeys(extra[key]))
+            rules[key] = list(merged)
+    # Übernimm fehlende Parameter-Sets, damit auf sie verwiesen werden kann
+    for name, members in (extra.get('sets') or {}).items():
+        if rules.get('sets') is None:
+            rules['sets'] = {}
+        rules['sets'].setdefault(name, members)
+    # Füge die Host-spezifischen Regeln hinzu
+    for host, host_rules in (extra.get('hosts') or {}).items():
+        if 'query' in host_rules:
+            merge_params(rules, host, host_rules['query'])
+        for key in ('query_regex', 'keep'):
+            if host_rules.get(key):
+                target = dict(rules['hosts'].get(host) or {})
+                target[key] = list(dict.fromkeys((target.get(key) or []) + host_rules[key]))
+                rules['hosts'][host] = target
+
+
+class RuleSnapshot(object):
+    """
+    Ein Stand der Regeln samt kompiliertem Host-Index
+
+    Ein Filter veröffentlicht einen neuen Stand mit einer einzigen Zuweisung.
+    Laufende Aufrufe arbeiten mit dem Stand weiter, den sie zu Beginn gelesen
+    haben, und sehen nie einen halb zusammengeführten Zustand. Gelernte
+    Parameter ergeben über extend einen neuen Stand, dessen Index nur um die
+    neuen Hosts ergänzt wird. Wird das hosts-Dictionary direkt verändert,
+    baut lookup den Index bei Bedarf vollständig neu auf.
+
+    Die Regel eines Host-Musters wird beim ersten Zugriff kompiliert: Verweise
+    auf Sets werden aufgelöst und die Parameter zu einem frozenset
+    zusammengefasst. Nach Änderungen an bestehenden Host-Regeln muss
+    invalidate oder build_index aufgerufen werden.
+    """
+    def __init__(self, rules, index=None):
+        """
+        Args:
+            rules: Das Regel-Dictionary
+            index: Bereits aufgebauter HostIndex (None = bei Bedarf aufbauen)
+        """
+        self.rules = rules
+        # Quelle, Index und kompilierte Regeln werden gemeinsam veröffentlicht
+        self._index = (rules.get("hosts"), index, {})
+
+    def build_index(self):
+        """Baut den Host-Index aus den aktuellen Host-Regeln auf und verwirft kompilierte Regeln"""
+        hosts = self.rules.get("hosts")
+        index = HostIndex(hosts or {})
+        self._index = (hosts, index, {})
+        self.compile_patterns()
+        return index
+
+    def compile_patterns(self):
+        """
+        Kompiliert alle Parameter-Muster (query_regex, default_regex) vorab
+
+        So werden ungültige Muster schon beim Laden gemeldet und verworfen,
+        statt erst beim ersten Filtern einer URL des Hosts.
+        """
+        lists = [self.rules.get("default_regex")]
+        lists.extend((host_rules or {}).get("query_regex") for host_rules in (self.rules.get("hosts") or {}).values())
+        for patterns in lists:
+            if patterns:
+                compile_param_patterns(tuple(patterns))
+
+    def invalidate(self):
+        """Verwirft die kompilierten Regeln, z.B. nachdem eine Host-Regel ergänzt wurde"""
+        hosts, index, _ = self._index
+        self._index = (hosts, index, {})
+
+    def extend(self, entries):
+        """
+        Liefert einen neuen Stand, in dem Host-Regeln um Parameter ergänzt sind
+
+        Dieser Stand bleibt unverändert: Das hosts-Dictionary wird flach
+        kopiert und nur die betroffenen Host-Regeln werden ersetzt. Neue Hosts
+        werden in eine Kopie des Index eingefügt, kompilierte Regeln der
+        übrigen Host-Muster werden übernommen.
+
+        Args:
+            entries: Iterable von Tupeln (Host, Parameterliste)
+        """
+        _, index, compiled = self._current_index()
+        hosts = dict(self.rules.get("hosts") or {})
+        added = []
+        changed = set()
+        for host, params in entries:
+            if not host:
+                continue
+            host_rules = hosts.get(host)
+            if host_rules:
+                host_rules = dict(host_rules)
+                host_rules["query"] = list(dict.fromkeys((host_rules.get("query") or []) + list(params)))
+            else:
+                if host not in hosts and host not in changed:
+                    added.append(host)
+                host_rules = {"query": list(params)}
+            hosts[host] = host_rules
+            changed.add(host)
+        rules = dict(self.rules)
+        rules["hosts"] = hosts
+        snapshot = RuleSnapshot(rules)
+        snapshot._index = (hosts, index.extended(added),
+                           {p: rule for p, rule in compiled.items() if p not in changed})
+        return snapshot
+
+    def _current_index(self):
+        hosts = self.rules.get("hosts")
+        state = self._index
+        source, index, _ = state
+        if index is None or (hosts is not None and (source is not hosts or index.size != len(hosts))):
+            self.build_index()
+            state = self._index
+        return state
+
+    def match(self, host):
+        """
+        Liefert das spezifischste passende Host-Muster
+
+        Returns:
+            Das Muster (Schlüssel in hosts) oder None, wenn kein Muster passt
+        """
+        if not self.rules.get("hosts"):
+            return None
+        return self._current_index()[1].lookup(host)
+
+    def lookup(self, host):
+        """
+        Liefert die spezifischste Host-Regel für einen Hostnamen
+
+        Returns:
+            Die Host-Regel als Dictionary oder None, wenn kein Muster passt
+        """
+        pattern = self.match(host)
+        if pattern is None:
+            return None
+        return self.rules["hosts"].get(pattern) or {}
+
+    def resolve(self, host):
+        """
+        Ermittelt die kompilierte Regel für einen Host
+
+        Eine Host-Regel ohne query und query_regex (etwa nur mit keep aus
+        AdGuard-Ausnahmen) ergänzt die Standardregeln, statt sie zu ersetzen.
+
+        Returns:
+            Tupel aus dem frozenset der zu entfernenden Parameter, der Angabe,
+            ob das Fragment behalten werden soll, dem regulären Ausdruck für
+            "name=wert" (oder None) und dem frozenset der zu behaltenden Parameter
+        """
+        hosts, index, compiled = self._current_index()
+        pattern = index.lookup(host) if hosts else None
+        rule = compiled.get(pattern)
+        if rule is None:
+            rule = compiled[pattern] = self._compile(hosts.get(pattern) if pattern is not None else None)
+        return rule
+
+    def _compile(self, host_rules):
+        rules = self.rules
+        if host_rules is not None and ("query" in host_rules or "query_regex" in host_rules):
+            params = host_rules.get("query")
+            patterns = host_rules.get("query_regex")
+            keep_fragment = host_rules.get("fragment", True)
+        else:
+            # Wenn kein Host-Match, verwende Standardregeln (Fragment behalten)
+            params = rules.get("default")
+            patterns = rules.get("default_regex")
+            keep_fragment = True if host_rules is None else host_rules.get("fragment", True)
+        remove = expand_params(params, rules.get("sets"))
+        keep = frozenset()
+        if host_rules is not None and host_rules.get("keep"):
+            keep = frozenset(expand_params(host_rules["keep"], rules.get("sets")))
+            remove -= keep
+        regex = compile_param_patterns(tuple(patterns)) if patterns else None
+        return frozenset(remove), keep_fragment, regex, keep
+
+
+class RuleWatcher(object):
+    """
+    Überwacht Regeldateien über ihre Änderungszeit und Größe
+
+    Ändert sich eine Datei, wird der Callback in einem Hintergrund-Thread
+    aufgerufen. Liefert er False (etwa weil die Datei gerade geschrieben wird
+    und noch nicht lesbar ist), wird es bei der nächsten Prüfung erneut versucht.
+    """
+    def __init__(self, paths, callback, interval=2.0):
+        """
+        Args:
+            paths: Liste der zu überwachenden Dateien
+            callback: Funktion ohne Argumente, die die Regeln neu lädt
+            interval: Abstand zwischen zwei Prüfungen in Sekunden
+        """
+        self.paths = list(paths)
+        self.callback = callback
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def signature(self):
+        """Liefert Änderungszeit und Größe aller Dateien (None für fehlende Dateien)"""
+        result = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                result.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                result.append(None)
+        return tuple(result)
+
+    def start(self):
+        """Startet die Überwachung"""
+        self._thread = threading.Thread(target=self._run, name="clearurl-watch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        last = self.signature()
+        while not self._stop.wait(self.interval):
+            current = self.signature()
+            if current == last:
+                continue
+            try:
+                if self.callback() is not False:
+                    last = current
+            except Exception as e:
+                logger.error(f"Fehler beim Neuladen der Regeln: {e}")
+
+    def stop(self):
+        """Beendet die Überwachung"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
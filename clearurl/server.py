@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import os
+import json
+import stat
+import socket
+import logging
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger('clearurl.server')
+
+MODES = (None, "rule", "auto", "full")
+
+
+def handle_request(filter, payload, default_mode=None):
+    """
+    Beantwortet eine einzelne Anfrage an den Daemon
+
+    Args:
+        filter: Der geladene Filter
+        payload: Dictionary mit "url" (einzelne URL) oder "urls" (Liste) und
+                 optional "mode"
+        default_mode: Filtermodus, falls die Anfrage keinen angibt
+
+    Returns:
+        Antwort als Dictionary mit "cleaned_url" bzw. "cleaned_urls" oder "error"
+    """
+    if not isinstance(payload, dict):
+        return {"error": "Anfrage muss ein JSON-Objekt sein"}
+    mode = payload.get("mode", default_mode)
+    if mode not in MODES:
+        return {"error": f"Unbekannter Modus: {mode}"}
+    if "urls" in payload:
+        urls = payload["urls"]
+        if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+            return {"error": "'urls' muss eine Liste von Strings sein"}
+        return {"cleaned_urls": filter.filter_urls(urls, mode=mode)}
+    url = payload.get("url")
+    if not isinstance(url, str):
+        return {"error": "'url' oder 'urls' fehlt"}
+    return {"cleaned_url": filter.filter_url(url, mode=mode)}
+
+
+class LineRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Zeilenbasiertes Protokoll für den Unix-Socket
+
+    Jede Zeile ist entweder eine URL oder ein JSON-Objekt wie bei
+    handle_request. Jede Antwort ist eine JSON-Zeile; Antworten kommen in der
+    Reihenfolge der Anfragen, sodass Clients beliebig viele Anfragen
+    hintereinander senden können (Pipelining).
+    """
+    def handle(self):
+        server = self.server
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                if line.startswith(b"{"):
+                    payload = json.loads(line)
+                else:
+                    payload = {"url": line.decode("utf-8")}
+                response = handle_request(server.filter, payload, server.mode)
+            except ValueError as e:
+                response = {"error": f"Ungültige Anfrage: {e}"}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class HTTPRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP/1.1-Schnittstelle mit Keep-Alive
+
+    GET /clean?url=...&mode=...   einzelne URL
+    POST /clean                   JSON-Objekt wie bei handle_request
+    GET /health                   Lebenszeichen
+    """
+    protocol_version = "HTTP/1.1"
+    server_version = "clearurl"
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply(self, payload):
+        response = handle_request(self.server.filter, payload, self.server.mode)
+        self.send_json(400 if "error" in response else 200, response)
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        if u.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif u.path == "/clean":
+            payload = {k: v[0] for k, v in parse_qs(u.query).items()}
+            self.reply(payload)
+        elif u.path == "/metrics":
+            self.send_metrics(parse_qs(u.query).get("format", ["prometheus"])[0])
+        else:
+            self.send_json(404, {"error": "Nicht gefunden"})
+
+    def send_metrics(self, format):
+        metrics = self.server.filter.metrics
+        if metrics is None:
+            self.send_json(404, {"error": "Metriken sind nicht aktiviert"})
+        elif format == "json":
+            self.send_json(200, metrics.to_dict())
+        else:
+            self.send_text(200, metrics.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/clean":
+            self.send_json(404, {"error": "Nicht gefunden"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"null")
+        except ValueError as e:
+            self.send_json(400, {"error": f"Ungültiges JSON: {e}"})
+            return
+        self.reply(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    UnixServer = None
+
+
+class HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def remove_stale_socket(path):
+    """
+    Entfernt den verwaisten Unix-Socket eines beendeten Daemons
+
+    Raises:
+        OSError, wenn unter dem Pfad etwas anderes als ein Socket liegt oder
+        dort noch ein Prozess lauscht
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} existiert bereits und ist kein Socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1.0)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        # Niemand lauscht mehr, der Socket stammt von einem beendeten Prozess
+        os.unlink(path)
+        return
+    except OSError as e:
+        raise OSError(f"Socket {path} ist nicht prüfbar: {e}")
+    finally:
+        probe.close()
+    raise OSError(f"Unter {path} lauscht bereits ein anderer Prozess")
+
+
+def make_server(filter, socket_path=None, host="127.0.0.1", port=8765, mode=None):
+    """
+    Erzeugt einen Daemon-Server, der einen geladenen Filter warm hält
+
+    Args:
+        filter: Der zu verwendende Filter (wird von allen Verbindungen geteilt)
+        socket_path: Pfad zu einem Unix-Socket; ohne Pfad wird HTTP verwendet
+        host: Adresse für den HTTP-Server
+        port: Port für den HTTP-Server (0 = beliebiger freier Port)
+        mode: Standard-Filtermodus für Anfragen ohne Modus
+
+    Returns:
+        Ein socketserver-Server; serve_forever() startet die Verarbeitung
+
+    Raises:
+        OSError, wenn der Socket-Pfad belegt ist (siehe remove_stale_socket)
+    """
+    if socket_path:
+        if UnixServer is None:
+            raise OSError("Unix-Sockets werden auf diesem System nicht unterstützt")
+        remove_stale_socket(socket_path)
+        server = UnixServer(socket_path, LineRequestHandler)
+    else:
+        server = HTTPServer((host, port), HTTPRequestHandler)
+    server.filter = filter
+    server.mode = mode
+    return server
+
+
+def serve(filter, socket_path=None, host="127.0.0.1", port=8765, mode=None):
+    """Startet den Daemon und blockiert bis zur Unterbrechung"""
+    server = make_server(filter, socket_path, host, port, mode)
+    if socket_path:
+        logger.info(f"clearurl-Daemon lauscht auf {socket_path}")
+    else:
+        logger.info(f"clearurl-Daemon lauscht auf http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
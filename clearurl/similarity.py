@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import re
+import heapq
+
+# Flüchtige Inhalte, die sich bei jedem Abruf ändern und vor dem Vergleich
+# entfernt werden. Die Muster beginnen mit festen Zeichen, damit die Suche
+# über große Seiten schnell bleibt.
+VOLATILE_ATTR_RE = re.compile(
+    rb'(?:nonce|csrf|xsrf|CSRF|XSRF|authenticity)[\w\-]*["\']?\s*(?:content|value)?\s*[=:]\s*["\'][^"\']*["\']'
+)
+VOLATILE_TIME_RE = re.compile(rb'-\d\d-\d\d[T ]\d\d:\d\d[\d:.]*(?:Z|[+\-]\d\d:?\d\d)?')
+
+# Einzelne Tokens, die als flüchtig gelten (Unix-Zeitstempel, lange Hex-Kennungen)
+VOLATILE_TOKEN_RE = re.compile(rb'\d{10,13}|[0-9a-fA-F]{32,}')
+
+TOKEN_RE = re.compile(rb'\w+|[^\w\s]')
+
+
+def strip_volatile(content):
+    """Entfernt flüchtige Inhalte wie Nonces, CSRF-Tokens und Uhrzeiten"""
+    return VOLATILE_TIME_RE.sub(b"", VOLATILE_ATTR_RE.sub(b"", content))
+
+
+def tokenize(content):
+    """Zerlegt Inhalt in Tokens und verwirft flüchtige Tokens"""
+    return [t for t in TOKEN_RE.findall(strip_volatile(content))
+            if len(t) < 10 or not VOLATILE_TOKEN_RE.fullmatch(t)]
+
+
+def iter_blocks(content):
+    """
+    Zerlegt Bytes oder ein Iterable von Byte-Blöcken in Blöcke, die an
+    Leerzeichen enden, damit kein Token über eine Blockgrenze reicht
+    """
+    if isinstance(content, (bytes, bytearray)):
+        yield bytes(content)
+        return
+    carry = b""
+    for chunk in content:
+        data = carry + chunk
+        cut = max(data.rfind(b" "), data.rfind(b"\n"))
+        if cut == -1:
+            carry = data
+            continue
+        yield data[:cut]
+        carry = data[cut:]
+    if carry:
+        yield carry
+
+
+class SequenceSimilarity(object):
+    """
+    Vergleich über difflib.SequenceMatcher
+
+    Exakt, aber im schlechtesten Fall quadratisch in der Seitengröße; nur für
+    kleine Seiten oder zum Vergleich mit dem bisherigen Verhalten gedacht.
+    """
+    def fingerprint(self, content):
+        if not isinstance(content, (bytes, bytearray)):
+            content = b"".join(content)
+        return b" ".join(tokenize(content))
+
+    def similarity(self, a, b):
+        from difflib import SequenceMatcher
+        return SequenceMatcher(None, a, b).ratio()
+
+
+class MinHashSimilarity(object):
+    """
+    Vergleich über Bottom-k-MinHash-Skizzen aus Token-Shingles
+
+    Der Fingerabdruck wird in einem Durchlauf über den Inhalt berechnet und
+    enthält höchstens num_hashes Werte, unabhängig von der Seitengröße.
+
+    Die Skizzen schätzen die Jaccard-Ähnlichkeit J der Shingle-Mengen;
+    similarity liefert daraus den Dice-Koeffizienten 2J/(1+J). Er liegt auf
+    derselben Skala wie SequenceMatcher.ratio() (Anteil übereinstimmender
+    Tokens), sodass der Schwellenwert von 0.95 für beide Verfahren gilt:
+    Ändert sich ein zusammenhängender Block von 2% der Tokens, liefern beide
+    etwa 0.98. Über die Seite verstreute Änderungen wirken sich über die
+    Shingles stärker aus, der Parameter wird dann eher behalten. Die
+    Schätzung schwankt bei 256 Werten um etwa ±0.015.
+    Fingerabdrücke sind nur innerhalb eines Prozesses vergleichbar, da sie auf
+    Pythons hash() beruhen.
+    """
+    def __init__(self, num_hashes=256, shingle_size=4):
+        """
+        Args:
+            num_hashes: Größe der Skizze (mehr Werte = genauere Schätzung)
+            shingle_size: Anzahl aufeinanderfolgender Tokens pro Shingle
+        """
+        self.num_hashes = num_hashes
+        self.shingle_size = shingle_size
+
+    def fingerprint(self, content):
+        k = self.num_hashes
+        n = self.shingle_size
+        hashes = set()
+        tail = []
+        tokens = 0
+        for block in iter_blocks(content):
+            block_tokens = tokenize(block)
+            tokens += len(block_tokens)
+            block_tokens = tail + block_tokens
+            if len(block_tokens) >= n:
+                hashes.update(map(hash, zip(*(block_tokens[i:] for i in range(n)))))
+                # Nur die k kleinsten Werte werden für die Skizze benötigt
+                if len(hashes) > k:
+                    hashes = set(heapq.nsmallest(k, hashes))
+            # Die letzten n-1 Tokens leiten das erste Shingle des nächsten Blocks ein
+            tail = block_tokens[-(n - 1):] if n > 1 else []
+        # Sehr kurze Inhalte bilden ein einziges Shingle
+        if 0 < tokens < n:
+            hashes.add(hash(tuple(tail)))
+        return frozenset(hashes)
+
+    def similarity(self, a, b):
+        if not a and not b:
+            return 1.0
+        if not a or not b:
+            return 0.0
+        union = heapq.nsmallest(self.num_hashes, a | b)
+        shared = sum(1 for h in union if h in a and h in b)
+        jaccard = shared / len(union)
+        return 2 * jaccard / (1 + jaccard)
+
+
+# Verfügbare Vergleichsverfahren nach Namen
+SIMILARITY_ENGINES = {
+    "minhash": MinHashSimilarity,
+    "sequence": SequenceSimilarity,
+}
+
+
+def get_similarity_engine(engine=None):
+    """
+    Liefert ein Vergleichsverfahren
+
+    Args:
+        engine: None (Standard: MinHash), ein Name aus SIMILARITY_ENGINES oder
+                ein Objekt mit den Methoden fingerprint und similarity
+    """
+    if engine is None:
+        return MinHashSimilarity()
+    if isinstance(engine, str):
+        try:
+            return SIMILARITY_ENGINES[engine]()
+        except KeyError:
+            raise ValueError(f"Unbekanntes Vergleichsverfahren: {engine}")
+    return engine
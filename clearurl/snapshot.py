@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import os
+import sys
+import marshal
+import logging
+
+logger = logging.getLogger('clearurl.snapshot')
+
+# Dateikennung und Formatversion des Snapshots
+SNAPSHOT_MAGIC = b"CLEARURL-RULES\n"
+SNAPSHOT_VERSION = 1
+
+
+def get_snapshot_path():
+    """Pfad zum Standard-Snapshot im rules-Verzeichnis"""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(package_dir, "rules", "compiled_rules.bin")
+
+
+def file_hash(path):
+    """Berechnet den SHA-256-Hash einer Datei"""
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def describe_sources(paths):
+    """
+    Erfasst Pfad, mtime, Größe und Hash der Quelldateien eines Snapshots
+
+    Nicht vorhandene Dateien werden mit None-Werten erfasst, damit ihr
+    späteres Auftauchen den Snapshot ebenfalls ungültig macht.
+    """
+    sources = []
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+            sources.append((path, st.st_mtime_ns, st.st_size, file_hash(path)))
+        except OSError:
+            sources.append((path, None, None, None))
+    return sources
+
+
+def sources_unchanged(recorded, paths):
+    """
+    Prüft, ob die Quelldateien seit dem Erstellen des Snapshots unverändert sind
+
+    Zuerst werden mtime und Größe verglichen; nur wenn sich die mtime geändert
+    hat, entscheidet der Inhalts-Hash.
+    """
+    if [r[0] for r in recorded] != [os.path.abspath(p) for p in paths]:
+        return False
+    for path, mtime, size, digest in recorded:
+        try:
+            st = os.stat(path)
+        except OSError:
+            if mtime is None:
+                continue
+            return False
+        if mtime is None or st.st_size != size:
+            return False
+        if st.st_mtime_ns != mtime and file_hash(path) != digest:
+            return False
+    return True
+
+
+def write_snapshot(path, rules, host_index, source_paths, options=None):
+    """
+    Schreibt zusammengeführte Regeln und Host-Index als binären Snapshot
+
+    Args:
+        path: Zieldatei
+        rules: Das zusammengeführte Regel-Dictionary
+        host_index: Der zugehörige HostIndex
+        source_paths: Dateien, aus denen die Regeln erzeugt wurden
+        options: Einstellungen, unter denen die Regeln erzeugt wurden
+
+    Returns:
+        True bei Erfolg, sonst False
+    """
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "python": tuple(sys.version_info[:2]),
+        "options": options or {},
+        "sources": describe_sources(source_paths),
+        "rules": rules,
+        "host_index": host_index.to_state(),
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        data = marshal.dumps(payload)
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(data)
+        os.replace(tmp_path, path)
+        logger.info(f"Regel-Snapshot in {path} gespeichert")
+        return True
+    except Exception as e:
+        logger.error(f"Fehler beim Speichern des Regel-Snapshots: {e}")
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return False
+
+
+def load_snapshot(path, source_paths, options=None):
+    """
+    Lädt einen Snapshot, sofern er zu den Quelldateien und Einstellungen passt
+
+    Returns:
+        Tupel (Regeln, Zustand des Host-Index) oder None, wenn der Snapshot
+        fehlt, veraltet ist oder nicht gelesen werden kann
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None
+            payload = marshal.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Regel-Snapshot {path} nicht lesbar: {e}")
+        return None
+
+    if (payload.get("version") != SNAPSHOT_VERSION
+            or payload.get("python") != tuple(sys.version_info[:2])
+            or payload.get("options") != (options or {})):
+        return None
+    if not sources_unchanged(payload.get("sources", []), source_paths):
+        logger.info(f"Regel-Snapshot {path} ist veraltet, lade YAML-Regeln")
+        return None
+    return payload["rules"], payload["host_index"]
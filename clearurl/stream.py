@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import io
+import sys
+import gzip
+import json
+from itertools import islice
+
+# Magische Bytes am Anfang einer gzip-Datei
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def open_input(path):
+    """
+    Öffnet eine Eingabequelle zeilenweise als Text
+
+    Args:
+        path: Dateipfad oder '-' für die Standardeingabe. gzip-komprimierte
+              Eingaben werden an ihren magischen Bytes erkannt.
+
+    Returns:
+        Ein Text-Dateiobjekt
+    """
+    if path == "-":
+        raw = sys.stdin.buffer
+    else:
+        raw = open(path, "rb")
+    if not isinstance(raw, io.BufferedReader):
+        raw = io.BufferedReader(raw)
+    if raw.peek(2)[:2] == GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw)
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+
+
+def iter_urls(paths):
+    """Liefert alle nicht-leeren Zeilen der Eingaben als URLs"""
+    for path in paths:
+        f = open_input(path)
+        try:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            if path != "-":
+                f.close()
+
+
+def chunked(iterable, size):
+    """Teilt ein Iterable in Listen mit höchstens size Elementen"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def format_results(urls, cleaned, json_output=False):
+    """Formatiert gefilterte URLs als Zeilen bzw. JSONL-Datensätze"""
+    if not json_output:
+        return "".join(c + "\n" for c in cleaned)
+    return "".join(
+        json.dumps({
+            "original_url": u,
+            "cleaned_url": c,
+            "was_cleaned": c != u
+        }, ensure_ascii=False) + "\n"
+        for u, c in zip(urls, cleaned)
+    )
+
+
+def write_chunks(chunks, out, json_output=False):
+    """
+    Schreibt bereits gefilterte Blöcke und leert die Ausgabe nach jedem Block
+
+    Args:
+        chunks: Iterable von Tupeln (Block der Eingabe, gefilterter Block)
+        out: Text-Dateiobjekt für die Ausgabe
+        json_output: Ob JSONL-Datensätze statt reiner URLs geschrieben werden
+
+    Returns:
+        Anzahl der geschriebenen URLs
+    """
+    count = 0
+    for chunk, cleaned in chunks:
+        out.write(format_results(chunk, cleaned, json_output))
+        out.flush()
+        count += len(chunk)
+    return count
+
+
+def clean_stream(filter, urls, out, mode=None, json_output=False, chunk_size=1000):
+    """
+    Filtert einen Strom von URLs blockweise und schreibt die Ergebnisse
+
+    Es wird immer nur ein Block im Speicher gehalten; nach jedem Block wird
+    die Ausgabe geleert.
+
+    Args:
+        filter: Der zu verwendende Filter
+        urls: Iterable von URLs
+        out: Text-Dateiobjekt für die Ausgabe
+        mode: Der Filtermodus wie bei Filter.filter_url
+        json_output: Ob JSONL-Datensätze statt reiner URLs geschrieben werden
+        chunk_size: Anzahl der URLs pro Block
+
+    Returns:
+        Anzahl der verarbeiteten URLs
+    """
+    chunks = ((chunk, filter.filter_urls(chunk, mode=mode)) for chunk in chunked(urls, chunk_size))
+    return write_chunks(chunks, out, json_output)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import os
+import json
+import time
+import threading
+import logging
+
+logger = logging.getLogger('clearurl.trace')
+
+
+def call_hooks(hooks, phase, stage, info):
+    """Ruft alle Hooks auf; Fehler in einem Hook unterbrechen das Filtern nicht"""
+    for hook in hooks:
+        try:
+            hook(phase, stage, info)
+        except Exception as e:
+            logger.error(f"Fehler in Hook {hook!r}: {e}")
+
+
+class StageRecorder(object):
+    """
+    Misst die Schritte eines Aufrufs und meldet sie an Metriken und Hooks
+
+    end liefert die Dauer des Schritts und trägt sie als duration (Sekunden)
+    in die Angaben für die Hooks ein.
+    """
+    __slots__ = ("metrics", "hooks", "started")
+
+    def __init__(self, metrics, hooks):
+        self.metrics = metrics
+        self.hooks = hooks
+        self.started = {}
+
+    def begin(self, stage, info=None):
+        if self.hooks:
+            call_hooks(self.hooks, "begin", stage, info or {})
+        self.started[stage] = time.perf_counter()
+
+    def end(self, stage, info=None):
+        duration = time.perf_counter() - self.started.pop(stage)
+        if self.metrics is not None:
+            self.metrics.observe("stage_seconds", duration, stage=stage)
+        if self.hooks:
+            info = dict(info or {})
+            info["duration"] = duration
+            call_hooks(self.hooks, "end", stage, info)
+        return duration
+
+
+class ChromeTraceCollector(object):
+    """
+    Hook, der die Ereignisse als Chrome-Trace-Events sammelt
+
+    Die Datei aus write lässt sich in chrome://tracing oder Perfetto öffnen.
+    Jeder Schritt wird als Beginn/Ende-Paar ("B"/"E") des Threads erfasst,
+    in dem er lief; Abrufe des Auto-Modus erscheinen daher in den Threads des
+    Probers. Die Angaben des Hooks stehen in args. Die Obergrenze max_events
+    gilt für ganze Paare: Ein Beginn wird nur erfasst, wenn auch für sein
+    Ende Platz bleibt, und das Ende eines verworfenen Beginns wird ebenfalls
+    verworfen, sodass der Trace immer ausgeglichen bleibt.
+
+    Verwendung:
+        collector = ChromeTraceCollector()
+        filter.add_hook(collector)
+        filter.filter_url(url)
+        collector.write("trace.json")
+    """
+    def __init__(self, max_events=None):
+        """
+        Args:
+            max_events: Höchstzahl gespeicherter Ereignisse (None = unbegrenzt);
+                        weitere Ereignisse werden gezählt und verworfen
+        """
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self._threads = set()
+        # Je Thread ein Stapel offener Schritte (True = Beginn wurde erfasst)
+        self._open = {}
+        # Für die Enden erfasster Schritte freigehaltene Plätze
+        self._reserved = 0
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def __call__(self, phase, stage, info):
+        ts = (time.perf_counter() - self._origin) * 1e6
+        tid = threading.get_ident()
+        event = {"name": stage, "cat": "clearurl", "ph": "B" if phase == "begin" else "E",
+                 "ts": round(ts, 3), "pid": self._pid, "tid": tid}
+        args = {k: v if isinstance(v, (str, int, float, bool, list, type(None))) else str(v)
+                for k, v in info.items() if k != "duration"}
+        if args:
+            event["args"] = args
+        with self._lock:
+            stack = self._open.setdefault(tid, [])
+            if phase == "begin":
+                needed = 2 if tid in self._threads else 3
+                if (self.max_events is not None
+                        and len(self.events) + self._reserved + needed > self.max_events):
+                    stack.append(False)
+                    self.dropped += 1
+                    return
+                stack.append(True)
+                self._reserved += 1
+            elif not stack or not stack.pop():
+                # Ende eines verworfenen (oder vor clear begonnenen) Schritts
+                self.dropped += 1
+                return
+            else:
+                self._reserved -= 1
+            if tid not in self._threads:
+                self._threads.add(tid)
+                self.events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                                    "args": {"name": threading.current_thread().name}})
+            self.events.append(event)
+
+    def clear(self):
+        """Verwirft alle gesammelten Ereignisse"""
+        with self._lock:
+            self.events = []
+            self.dropped = 0
+            self._threads = set()
+            self._open = {}
+            self._reserved = 0
+
+    def to_dict(self):
+        """Liefert die Ereignisse im Chrome-Trace-Format"""
+        with self._lock:
+            return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        """Schreibt die Ereignisse als JSON-Datei"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        logger.info(f"{len(self.events)} Trace-Ereignisse in {path} geschrieben")
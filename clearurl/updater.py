@@ -3,96 +3,385 @@
 
 import os
 import re
-import yaml
-import requests
+import json
+import time
 import logging
-from pathlib import Path
+from itertools import chain
 from datetime import datetime, timedelta
 
-# Logger konfigurieren
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# yaml und requests werden erst geladen, wenn Regeln gelesen, geschrieben
+# oder heruntergeladen werden
 logger = logging.getLogger('clearurl.updater')
 
 # URLs für AdGuard-Filterlisten
 ADGUARD_SPECIFIC_URL = "https://raw.githubusercontent.com/AdguardTeam/AdguardFilters/master/TrackParamFilter/sections/specific.txt"
 ADGUARD_GENERAL_URL = "https://raw.githubusercontent.com/AdguardTeam/AdguardFilters/master/TrackParamFilter/sections/general_url.txt"
+ADGUARD_URLS = (ADGUARD_SPECIFIC_URL, ADGUARD_GENERAL_URL)
+
+# Version des erzeugten Regelformats; bei Änderungen am Parser erhöhen, damit
+# unveränderte Listen trotzdem neu geparst werden
+ADGUARD_FORMAT_VERSION = 2
+
+# Zeitstempel der Regeldatei; wird nur in den ersten bzw. letzten Bytes gesucht
+LAST_UPDATED_RE = re.compile(rb"^last_updated:\s*['\"]?([\d\- :]+?)['\"]?\s*$", re.MULTILINE)
+LAST_UPDATED_WINDOW = 512
 
 # Pfad zur AdGuard-Regeldatei
 def get_rules_path():
-    # Versuche zuerst den installierten Paket-Pfad
+    # Versuche zuerst den installierten Paket-Pfad; das Verzeichnis wird erst
+    # beim Speichern angelegt
     package_dir = os.path.dirname(os.path.abspath(__file__))
-    rules_dir = os.path.join(package_dir, "rules")
-    
-    # Stelle sicher, dass das Verzeichnis existiert
-    os.makedirs(rules_dir, exist_ok=True)
-    
-    return os.path.join(rules_dir, "adguard_rules.yaml")
+    return os.path.join(package_dir, "rules", "adguard_rules.yaml")
+
+def get_meta_path(file_path=None):
+    """Pfad zur Metadaten-Datei (ETag, Last-Modified, Prüfsummen) neben der Regeldatei"""
+    if file_path is None:
+        file_path = get_rules_path()
+    return os.path.splitext(file_path)[0] + ".meta.json"
+
+def load_meta(file_path=None):
+    """
+    Lädt die Metadaten der letzten Aktualisierung
+
+    Returns:
+        Dictionary mit den Schlüsseln "format", "checked" und "sources"
+        (URL -> etag, last_modified, sha256); leer, falls nicht vorhanden
+    """
+    try:
+        with open(get_meta_path(file_path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if isinstance(meta, dict):
+            return meta
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"Metadaten der AdGuard-Regeln nicht lesbar: {e}")
+    return {}
+
+def save_meta(meta, file_path=None):
+    """Speichert die Metadaten atomar"""
+    meta_path = get_meta_path(file_path)
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, meta_path)
+        return True
+    except OSError as e:
+        logger.error(f"Fehler beim Speichern der Metadaten: {e}")
+        return False
 
-def download_adguard_lists():
+def get_list_path(url, file_path=None):
+    """Pfad zur zuletzt geladenen Fassung einer Liste neben der Regeldatei"""
+    import hashlib
+    if file_path is None:
+        file_path = get_rules_path()
+    name = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+    return f"{os.path.splitext(file_path)[0]}.list-{name}.txt"
+
+def load_list(url, entry, file_path=None):
+    """
+    Lädt die zuletzt geladene Fassung einer Liste
+
+    Returns:
+        Den Text oder None, falls er fehlt oder nicht zur Prüfsumme in den
+        Metadaten passt
+    """
+    import hashlib
+    try:
+        with open(get_list_path(url, file_path), 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return None
+    if hashlib.sha256(text.encode('utf-8')).hexdigest() != entry.get("sha256"):
+        return None
+    return text
+
+def save_list(url, text, file_path=None):
+    """Speichert die geladene Fassung einer Liste atomar"""
+    list_path = get_list_path(url, file_path)
+    tmp_path = f"{list_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, list_path)
+        return True
+    except OSError as e:
+        logger.error(f"Fehler beim Speichern der Liste {url}: {e}")
+        return False
+
+def download_list(url, validators=None, timeout=30):
+    """
+    Lädt eine Filterliste herunter, bedingt über ETag/If-Modified-Since
+
+    Args:
+        url: URL der Liste
+        validators: Gespeicherte Metadaten dieser Liste (etag, last_modified)
+        timeout: Zeitlimit in Sekunden
+
+    Returns:
+        Tupel (Text oder None bei HTTP 304, neue Metadaten der Liste)
+
+    Raises:
+        requests.RequestException bei Netzwerk- oder HTTP-Fehlern
+    """
+    import hashlib
+    import requests
+
+    validators = validators or {}
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None, dict(validators)
+    response.raise_for_status()
+
+    text = response.text
+    entry = {"sha256": hashlib.sha256(text.encode('utf-8')).hexdigest()}
+    if response.headers.get("ETag"):
+        entry["etag"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        entry["last_modified"] = response.headers["Last-Modified"]
+    return text, entry
+
+def fetch_adguard_lists(urls=ADGUARD_URLS, sources=None):
+    """
+    Lädt mehrere Filterlisten gleichzeitig (bedingt) herunter
+
+    Args:
+        urls: URLs der Listen
+        sources: Gespeicherte Metadaten je URL (None = unbedingt laden)
+
+    Returns:
+        Liste von Tupeln (Text oder None bei HTTP 304, Metadaten) in der
+        Reihenfolge der URLs
+
+    Raises:
+        requests.RequestException, falls eine Liste nicht geladen werden konnte
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    sources = sources or {}
+    with ThreadPoolExecutor(max_workers=len(urls) or 1) as executor:
+        futures = [executor.submit(download_list, url, sources.get(url)) for url in urls]
+        return [future.result() for future in futures]
+
+def download_adguard_lists(urls=ADGUARD_URLS):
     """
     Lädt die AdGuard-Filterlisten herunter und gibt sie als Liste zurück
     """
+    import requests
+
     try:
-        specific_response = requests.get(ADGUARD_SPECIFIC_URL)
-        specific_response.raise_for_status()
-        
-        general_response = requests.get(ADGUARD_GENERAL_URL)
-        general_response.raise_for_status()
-        
-        return specific_response.text.splitlines(), general_response.text.splitlines()
+        results = fetch_adguard_lists(urls)
+        return tuple(text.splitlines() for text, _ in results)
     except requests.RequestException as e:
         logger.error(f"Fehler beim Herunterladen der AdGuard-Listen: {e}")
-        return [], []
+        return tuple([] for _ in urls)
+
+# Bestandteile einer AdGuard-Regel
+HOST_PATTERN_RE = re.compile(r'^\|\|([\w.*\-]+)\^?\|?$')
+MODIFIER_SPLIT_RE = re.compile(r'(?<!\\),')
+REGEX_PARAM_RE = re.compile(r'^/(.*)/([a-z]*)$')
+# Häufigste Form (||host^$removeparam=name bzw. $removeparam=name) ohne weitere Modifikatoren
+SIMPLE_RULE_RE = re.compile(r'^(?:\|\|([\w.\-]+)\^)?\$removeparam=([\w.\-\[\]]+)$')
+
+def parse_param(value):
+    """
+    Wandelt den Wert von $removeparam in einen Parameternamen oder ein Muster um
+
+    Returns:
+        Tupel ('name', Name), ('regex', Python-Muster) oder (Grund, None),
+        falls der Wert nicht unterstützt wird
+    """
+    if not value:
+        return "remove_all", None
+    if value.startswith('~'):
+        return "inverted", None
+    match = REGEX_PARAM_RE.match(value)
+    if match is None:
+        return "name", value
+    pattern, flags = match.groups()
+    if flags.strip('i'):
+        return "invalid_regex", None
+    if 'i' in flags:
+        pattern = f"(?i:{pattern})"
+    try:
+        re.compile(pattern)
+    except re.error:
+        return "invalid_regex", None
+    return "regex", pattern
+
+def parse_adguard_line(line):
+    """
+    Zerlegt eine Zeile einer AdGuard-Liste
 
-def parse_adguard_rules(specific_lines, general_lines):
+    Returns:
+        Tupel (Ausnahme, Hosts, ausgenommene Hosts, Art, Wert) oder
+        (None, Grund), falls die Zeile übersprungen wird. Hosts ist leer für
+        allgemeine Regeln; Art ist 'name', 'regex' oder 'remove_all'.
+    """
+    exception = line.startswith('@@')
+    if exception:
+        line = line[2:]
+    pattern, sep, options = line.partition('$')
+    if not sep:
+        return None, "no_removeparam"
+
+    if pattern in ('', '*'):
+        hosts = []
+    else:
+        match = HOST_PATTERN_RE.match(pattern)
+        if match is None:
+            return None, "unsupported_pattern"
+        hosts = [match.group(1)]
+
+    param = None
+    excluded = []
+    has_pattern = bool(hosts)
+    for modifier in MODIFIER_SPLIT_RE.split(options):
+        name, _, value = modifier.partition('=')
+        name = name.strip()
+        if name == 'removeparam':
+            param = value.replace('\\,', ',')
+        elif name == 'domain':
+            for domain in value.split('|'):
+                if domain.startswith('~'):
+                    excluded.append(domain[1:])
+                elif domain and not has_pattern:
+                    # Bei einem Host-Muster gilt das Muster, nicht $domain
+                    hosts.append(domain)
+        elif name == 'badfilter':
+            return None, "badfilter"
+    if param is None:
+        return None, "no_removeparam"
+
+    kind, value = parse_param(param)
+    if kind == "remove_all" and not exception:
+        return None, "remove_all"
+    if kind not in ("name", "regex", "remove_all"):
+        return None, kind
+    if kind == "regex" and (exception or excluded):
+        return None, "unsupported_exception"
+    if kind == "remove_all" and not hosts:
+        return None, "unsupported_exception"
+    return exception, hosts, excluded, kind, value
+
+def parse_adguard_rules(specific_lines, general_lines, stats=None):
     """
     Parst die AdGuard-Filterlisten und konvertiert sie in das ClearURL-Format
+
+    Beide Listen werden in einem Durchlauf verarbeitet. Unterstützt werden
+    Host-Muster (||host^), $domain=a|b|~c, Ausnahmen (@@) sowie Parameter als
+    Name oder als /regex/ (mit Option i). Reguläre Ausdrücke werden als
+    query_regex bzw. default_regex übernommen und gegen "name=wert" geprüft,
+    Ausnahmen als keep-Liste des Hosts.
+
+    Args:
+        specific_lines: Zeilen der hostspezifischen Liste
+        general_lines: Zeilen der allgemeinen Liste
+        stats: Optionales Dictionary, in das die Anzahl der Zeilen ("lines"),
+               der übernommenen Regeln ("rules") und der übersprungenen Zeilen
+               je Grund ("skipped") geschrieben wird
     """
     hosts = {}
     default_params = set()
-    
-    # Reguläre Ausdrücke für das Parsen
-    host_param_re = re.compile(r'^\|\|([\w\.\-]+)\^.*?(?:removeparam|tracking-\w+)=(.+)$')
-    general_param_re = re.compile(r'^(?:\$|@@\$)(?:~?(?:xmlhttprequest|third-party|document|popup|cookie),)*?(?:removeparam|tracking-\w+)=(.+?)(?:,|$)')
-    
-    # Spezifische Regeln parsen (host-basiert)
-    for line in specific_lines:
-        line = line.strip()
-        if line and not line.startswith('!'):  # Ignoriere Kommentare
-            match = host_param_re.match(line)
-            if match:
-                host, params_str = match.groups()
-                params = [p.strip() for p in params_str.split(',')]
-                
-                if host in hosts:
-                    hosts[host]['query'].extend(params)
-                    # Entferne Duplikate
-                    hosts[host]['query'] = list(set(hosts[host]['query']))
-                else:
-                    hosts[host] = {'query': params, 'fragment': True}
-    
-    # Allgemeine Regeln parsen
-    for line in general_lines:
+    default_regex = set()
+    default_keep = set()
+    lines = rules_count = 0
+    skipped = {}
+
+    def host_entry(host):
+        entry = hosts.get(host)
+        if entry is None:
+            entry = hosts[host] = {'query': set(), 'regex': set(), 'keep': set(), 'exempt': False}
+        return entry
+
+    for line in chain(specific_lines, general_lines):
+        lines += 1
         line = line.strip()
-        if line and not line.startswith('!'):  # Ignoriere Kommentare
-            match = general_param_re.match(line)
-            if match:
-                params_str = match.group(1)
-                params = [p.strip() for p in params_str.split(',')]
-                default_params.update(params)
-    
-    # Erstelle das Regeln-Dictionary
+        if not line or line[0] in '!#[':  # Ignoriere Kommentare und Kopfzeilen
+            skipped["comment"] = skipped.get("comment", 0) + 1
+            continue
+        simple = SIMPLE_RULE_RE.match(line)
+        if simple is not None:
+            rules_count += 1
+            host, param = simple.groups()
+            if host:
+                host_entry(host)['query'].add(param)
+            else:
+                default_params.add(param)
+            continue
+        parsed = parse_adguard_line(line)
+        if parsed[0] is None:
+            skipped[parsed[1]] = skipped.get(parsed[1], 0) + 1
+            continue
+        exception, targets, excluded, kind, value = parsed
+        rules_count += 1
+
+        if exception:
+            if kind == "remove_all":
+                for host in targets:
+                    host_entry(host)['exempt'] = True
+            elif targets:
+                for host in targets:
+                    host_entry(host)['keep'].add(value)
+            else:
+                default_keep.add(value)
+            continue
+
+        key = 'query' if kind == "name" else 'regex'
+        if targets:
+            for host in targets:
+                host_entry(host)[key].add(value)
+        elif kind == "name":
+            default_params.add(value)
+        else:
+            default_regex.add(value)
+        # Ausgenommene Hosts behalten den Parameter
+        for host in excluded:
+            host_entry(host)['keep'].add(value)
+
+    host_rules = {}
+    for host, entry in hosts.items():
+        rule = {}
+        if entry['exempt']:
+            rule['query'] = []
+        else:
+            if entry['query']:
+                rule['query'] = sorted(entry['query'] - entry['keep'])
+            if entry['regex']:
+                rule['query_regex'] = sorted(entry['regex'])
+            if entry['keep']:
+                rule['keep'] = sorted(entry['keep'])
+        rule['fragment'] = True
+        host_rules[host] = rule
+    default_list = sorted(default_params - default_keep)
+
+    if stats is not None:
+        stats["lines"] = lines
+        stats["rules"] = rules_count
+        stats["skipped"] = skipped
+    logger.info(f"{rules_count} AdGuard-Regeln aus {lines} Zeilen übernommen, übersprungen: {skipped}")
+
+    # Erstelle das Regeln-Dictionary (last_updated zuerst, damit es im Dateikopf steht)
     rules = {
-        'hosts': hosts,
-        'default': list(default_params),
+        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'hosts': host_rules,
+        'default': default_list,
         'sets': {
             'adguard-trackparams': {
                 'ref': 'adguard-trackparams',
-                'list': list(default_params)
+                'list': list(default_list)
             }
-        },
-        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
     }
+    if default_regex:
+        rules['default_regex'] = sorted(default_regex)
     
     return rules
 
@@ -104,6 +393,8 @@ def save_adguard_rules(rules, file_path=None):
         file_path = get_rules_path()
     
     try:
+        import yaml
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
         with open(file_path, 'w', encoding='utf-8') as f:
             yaml.safe_dump(rules, f, sort_keys=False, allow_unicode=True)
         logger.info(f"AdGuard-Regeln wurden erfolgreich in {file_path} gespeichert")
@@ -121,6 +412,7 @@ def load_adguard_rules(file_path=None):
     
     try:
         if os.path.exists(file_path):
+            import yaml
             with open(file_path, 'r', encoding='utf-8') as f:
                 return yaml.safe_load(f)
         else:
@@ -130,9 +422,31 @@ def load_adguard_rules(file_path=None):
         logger.error(f"Fehler beim Laden der AdGuard-Regeln: {e}")
         return None
 
+def read_last_updated(file_path):
+    """
+    Liest den Zeitstempel last_updated aus Kopf oder Ende der Regeldatei,
+    ohne die gesamte YAML-Datei zu parsen
+
+    Returns:
+        datetime oder None, falls kein Zeitstempel gefunden wurde
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read(LAST_UPDATED_WINDOW)
+        match = LAST_UPDATED_RE.search(data)
+        if match is None:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - LAST_UPDATED_WINDOW, 0))
+            match = LAST_UPDATED_RE.search(f.read())
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1).decode('ascii'), '%Y-%m-%d %H:%M:%S')
+
 def should_update_rules(file_path=None, days=1):
     """
     Überprüft, ob die Regeln aktualisiert werden sollten (älter als X Tage)
+
+    Maßgeblich ist die letzte Prüfung laut Metadaten-Datei, ersatzweise der
+    Zeitstempel im Kopf der Regeldatei. Die Regeln selbst werden nicht geladen.
     """
     if file_path is None:
         file_path = get_rules_path()
@@ -142,39 +456,118 @@ def should_update_rules(file_path=None, days=1):
         return True
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            rules = yaml.safe_load(f)
-        
-        if not rules or 'last_updated' not in rules:
-            return True
-        
-        last_updated = datetime.strptime(rules['last_updated'], '%Y-%m-%d %H:%M:%S')
+        checked = load_meta(file_path).get("checked")
+        if checked:
+            last_updated = datetime.strptime(checked, '%Y-%m-%d %H:%M:%S')
+        else:
+            last_updated = read_last_updated(file_path)
+            if last_updated is None:
+                return True
         return (datetime.now() - last_updated) > timedelta(days=days)
     except Exception as e:
         logger.error(f"Fehler bei der Überprüfung, ob Regeln aktualisiert werden sollten: {e}")
         return True
 
-def update_adguard_rules(force=False, file_path=None):
+def refresh_adguard_rules(force=False, file_path=None, urls=None, metrics=None):
     """
-    Aktualisiert die AdGuard-Regeln, wenn sie veraltet sind oder bei erzwungener Aktualisierung
+    Aktualisiert die AdGuard-Regeln und liefert neu erzeugte Regeln zurück
+
+    Beide Listen werden gleichzeitig und bedingt (ETag/If-Modified-Since)
+    geladen. Antwortet der Server mit 304 oder ist der Inhalt unverändert,
+    entfallen Parsen und Schreiben der Regeldatei. Die zuletzt geladene
+    Fassung jeder Liste liegt neben der Regeldatei; ändert sich nur eine
+    Liste, wird die andere von dort gelesen statt erneut geladen.
+
+    Args:
+        force: Auch aktualisieren, wenn die Regeln noch aktuell sind
+        file_path: Pfad zur Regeldatei (None = Standardpfad)
+        urls: Tupel (spezifische Liste, allgemeine Liste); None = AdGuard-URLs
+        metrics: Optionale MetricsRegistry für Dauer und Ergebnis der Aktualisierung
+
+    Returns:
+        Tupel (Erfolg, Regeln); die Regeln sind nur gesetzt, wenn die
+        Regeldatei neu geschrieben wurde, sodass sie nicht erneut geladen
+        werden muss
     """
     if file_path is None:
         file_path = get_rules_path()
+    if urls is None:
+        urls = ADGUARD_URLS
     
-    if force or should_update_rules(file_path):
-        logger.info("Aktualisiere AdGuard-Regeln...")
-        specific_lines, general_lines = download_adguard_lists()
-        
-        if not specific_lines and not general_lines:
-            logger.warning("Konnte keine AdGuard-Listen herunterladen, verwende bestehende Regeln")
-            return False
-        
-        rules = parse_adguard_rules(specific_lines, general_lines)
-        return save_adguard_rules(rules, file_path)
-    else:
+    if not (force or should_update_rules(file_path)):
         logger.info("AdGuard-Regeln sind aktuell, keine Aktualisierung notwendig")
-        return True
+        if metrics is not None:
+            metrics.inc("adguard_updates_total", result="current")
+        return True, None
+    
+    import requests
+
+    logger.info("Aktualisiere AdGuard-Regeln...")
+    meta = load_meta(file_path)
+    # Validatoren nur verwenden, wenn die Regeldatei im aktuellen Format vorliegt
+    reusable = os.path.exists(file_path) and meta.get("format") == ADGUARD_FORMAT_VERSION
+    sources = meta.get("sources", {}) if reusable else {}
+    started = time.perf_counter()
+    try:
+        results = fetch_adguard_lists(urls, sources)
+        unchanged = [text is None or entry.get("sha256") == sources.get(url, {}).get("sha256")
+                     for url, (text, entry) in zip(urls, results)]
+        if not all(unchanged):
+            # Unveränderte Listen kommen aus der gespeicherten Fassung; nur
+            # fehlende oder beschädigte werden vollständig nachgeladen
+            results = [(load_list(url, entry, file_path), entry) if text is None else (text, entry)
+                       for url, (text, entry) in zip(urls, results)]
+            missing = [url for url, (text, _) in zip(urls, results) if text is None]
+            if missing:
+                reloaded = dict(zip(missing, fetch_adguard_lists(missing)))
+                results = [reloaded.get(url, result) for url, result in zip(urls, results)]
+    except requests.RequestException as e:
+        logger.error(f"Fehler beim Herunterladen der AdGuard-Listen: {e}")
+        logger.warning("Konnte keine AdGuard-Listen herunterladen, verwende bestehende Regeln")
+        if metrics is not None:
+            metrics.inc("adguard_updates_total", result="failed")
+        return False, None
+    if metrics is not None:
+        metrics.observe("adguard_update_seconds", time.perf_counter() - started, phase="download")
+    for url, (text, entry) in zip(urls, results):
+        if text is not None and (entry.get("sha256") != sources.get(url, {}).get("sha256")
+                                 or not os.path.exists(get_list_path(url, file_path))):
+            save_list(url, text, file_path)
+    
+    meta = {
+        "format": ADGUARD_FORMAT_VERSION,
+        "checked": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "sources": {url: entry for url, (_, entry) in zip(urls, results)},
+    }
+    if all(unchanged):
+        logger.info("AdGuard-Listen unverändert, Regeldatei bleibt bestehen")
+        save_meta(meta, file_path)
+        if metrics is not None:
+            metrics.inc("adguard_updates_total", result="unchanged")
+        return True, None
+    
+    started = time.perf_counter()
+    specific_lines, general_lines = (text.splitlines() for text, _ in results)
+    rules = parse_adguard_rules(specific_lines, general_lines)
+    if metrics is not None:
+        parsed = time.perf_counter()
+        metrics.observe("adguard_update_seconds", parsed - started, phase="parse")
+    saved = save_adguard_rules(rules, file_path)
+    if metrics is not None:
+        metrics.observe("adguard_update_seconds", time.perf_counter() - parsed, phase="save")
+        metrics.inc("adguard_updates_total", result="updated" if saved else "failed")
+    if not saved:
+        return False, None
+    save_meta(meta, file_path)
+    return True, rules
+
+def update_adguard_rules(force=False, file_path=None, urls=None, metrics=None):
+    """
+    Aktualisiert die AdGuard-Regeln, wenn sie veraltet sind oder bei erzwungener Aktualisierung
+    """
+    return refresh_adguard_rules(force, file_path, urls, metrics)[0]
 
 if __name__ == "__main__":
     # Manuelles Update bei direkter Ausführung des Skripts
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     update_adguard_rules(force=True)
\ No newline at end of file
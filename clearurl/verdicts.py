@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# coding=UTF-8
+
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger('clearurl.verdicts')
+
+# Mögliche Urteile über einen Parameter
+REMOVABLE = "removable"
+REQUIRED = "required"
+
+
+class VerdictStore(object):
+    """
+    Speicher für Urteile des Auto-Modus je (Host, Parameter)
+
+    Neben entbehrlichen Parametern werden auch notwendige Parameter (z.B. id
+    oder page) gespeichert, damit sie nicht bei jeder URL erneut geprüft
+    werden. Jedes Urteil läuft nach seiner TTL ab. Ohne Pfad liegen die
+    Urteile nur im Speicher, mit Pfad zusätzlich in einer SQLite-Datei, die
+    sich mehrere Prozesse teilen können. Alle Methoden sind thread-sicher.
+    """
+    def __init__(self, path=None, removable_ttl=30 * 86400, required_ttl=7 * 86400, max_entries=100000):
+        """
+        Args:
+            path: Pfad zur SQLite-Datei (None = nur im Speicher)
+            removable_ttl: Gültigkeit von "entbehrlich"-Urteilen in Sekunden
+            required_ttl: Gültigkeit von "notwendig"-Urteilen in Sekunden
+            max_entries: Maximale Anzahl an Urteilen im Speicher
+        """
+        self.path = path
+        self.ttl = {REMOVABLE: removable_ttl, REQUIRED: required_ttl}
+        self.max_entries = max_entries
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._inherited = None
+        if path:
+            self._db = self._connect()
+
+    def _connect(self):
+        # sqlite3 wird nur für dauerhaft gespeicherte Urteile geladen
+        import sqlite3
+        db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        with db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "host TEXT NOT NULL, param TEXT NOT NULL, verdict TEXT NOT NULL, "
+                "expires REAL NOT NULL, PRIMARY KEY (host, param))"
+            )
+        self._pid = os.getpid()
+        return db
+
+    def _connection(self):
+        """Liefert die Verbindung des aktuellen Prozesses oder None"""
+        if self._db is not None and self._pid != os.getpid():
+            # Eine per fork geerbte Verbindung darf weder benutzt noch
+            # geschlossen werden; sie wird nur festgehalten
+            self._inherited = self._db
+            self._db = self._connect()
+        return self._db
+
+    def _remember(self, key, entry):
+        if key not in self._memory and len(self._memory) >= self.max_entries:
+            # Ältesten Eintrag verdrängen (Einfügereihenfolge)
+            del self._memory[next(iter(self._memory))]
+        self._memory[key] = entry
+
+    def get_many(self, host, params):
+        """
+        Liefert die gültigen Urteile für die Parameter eines Hosts
+
+        Returns:
+            Dictionary Parameter -> REMOVABLE/REQUIRED für alle bekannten Parameter
+        """
+        now = time.time()
+        verdicts = {}
+        missing = []
+        with self._lock:
+            for param in params:
+                entry = self._memory.get((host, param))
+                if entry is not None and entry[1] > now:
+                    verdicts[param] = entry[0]
+                else:
+                    missing.append(param)
+            db = self._connection() if missing else None
+            if db is not None:
+                placeholders = ",".join("?" * len(missing))
+                rows = db.execute(
+                    f"SELECT param, verdict, expires FROM verdicts "
+                    f"WHERE host = ? AND expires > ? AND param IN ({placeholders})",
+                    [host, now] + missing
+                ).fetchall()
+                for param, verdict, expires in rows:
+                    verdicts[param] = verdict
+                    self._remember((host, param), (verdict, expires))
+        return verdicts
+
+    def get(self, host, param):
+        """Liefert das gültige Urteil für einen Parameter oder None"""
+        return self.get_many(host, [param]).get(param)
+
+    def put_many(self, host, verdicts):
+        """
+        Speichert Urteile für die Parameter eines Hosts
+
+        Args:
+            host: Der Hostname
+            verdicts: Dictionary Parameter -> REMOVABLE/REQUIRED
+        """
+        if not verdicts:
+            return
+        now = time.time()
+        rows = [(host, param, verdict, now + self.ttl[verdict]) for param, verdict in verdicts.items()]
+        with self._lock:
+            for _, param, verdict, expires in rows:
+                self._remember((host, param), (verdict, expires))
+            db = self._connection()
+            if db is not None:
+                try:
+                    with db:
+                        db.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)", rows)
+                except Exception as e:
+                    logger.error(f"Fehler beim Speichern der Urteile: {e}")
+
+    def put(self, host, param, verdict):
+        """Speichert ein Urteil für einen Parameter"""
+        self.put_many(host, {param: verdict})
+
+    def clear(self):
+        """Verwirft alle Urteile"""
+        with self._lock:
+            self._memory.clear()
+            db = self._connection()
+            if db is not None:
+                with db:
+                    db.execute("DELETE FROM verdicts")
+
+    def close(self):
+        """Schließt die Datenbankverbindung"""
+        with self._lock:
+            db = self._connection()
+            if db is not None:
+                db.close()
+                self._db = None
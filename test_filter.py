@@ -71,7 +71,7 @@ def test_filter_url_wildcard():
 
 # Überschreibe die auto-Methode für den Test
 class MockFilter(Filter):
-    def filter_auto(self):
+    def filter_auto(self, url):
         # Für den Test: keine automatische Filterung durchführen
         return False
 
@@ -188,6 +188,954 @@ def test_filter_url_auto_mode(monkeypatch):
     url = "https://www.example.com/page?param1=value1&param2=value2"
     assert filter.filter_url(url, mode="auto") == url
 
+# Tests für den kompilierten Host-Index
+from clearurl.hostindex import HostIndex
+
+def test_host_index_most_specific():
+    index = HostIndex(["*.example.com", "*.shop.example.com", "shop.example.com", "*.example.*"])
+
+    assert index.lookup("shop.example.com") == "shop.example.com"
+    assert index.lookup("a.shop.example.com") == "*.shop.example.com"
+    assert index.lookup("a.b.example.com") == "*.example.com"
+    assert index.lookup("www.example.org") == "*.example.*"
+    assert index.lookup("example.com") is None
+    assert index.lookup("other.org") is None
+
+def test_filter_host_index_many_rules():
+    filter = Filter(use_adguard=False)
+    for i in range(5000):
+        filter.add_to_rule(f"host{i}.example.net", [f"p{i}"])
+    filter.rules["hosts"]["*.host42.example.net"] = {"query": ["x"], "fragment": True}
+
+    assert filter.filter_url("https://host42.example.net/?p42=1&p43=2", mode="rule") == "https://host42.example.net/?p43=2"
+    assert filter.filter_url("https://a.host42.example.net/?x=1&p42=2", mode="rule") == "https://a.host42.example.net/?p42=2"
+
+def test_host_index_extended():
+    from clearurl.hostindex import HostIndex
+
+    # Ein erweiterter Index lässt den bisherigen unverändert
+    index = HostIndex(["example.com", "*.example.org"])
+    extended = index.extended(["a.example.com", "*.b.example.org"])
+    assert extended.lookup("a.example.com") == "a.example.com"
+    assert extended.lookup("x.b.example.org") == "*.b.example.org"
+    assert extended.size == 4
+    assert index.lookup("a.example.com") is None
+    assert index.lookup("x.b.example.org") == "*.example.org"
+
+# Tests für die Batch-API
+def test_filter_urls_batch():
+    filter = Filter(use_adguard=False)
+    urls = [
+        "https://www.douban.com/annual/2019?source=broadcast&dt_dapp=1",
+        "http://test.com/index.php?id=123&utm_source=test",
+        "https://www.example.com/plain",
+        "",
+        "https://m.douban.com/annual/2019#test",
+        "http://test.com/index.php?fbclid=123abc",
+    ]
+
+    assert filter.filter_urls(urls, mode="rule") == [
+        "https://www.douban.com/annual/2019",
+        "http://test.com/index.php?id=123",
+        "https://www.example.com/plain",
+        "",
+        "https://m.douban.com/annual/2019",
+        "http://test.com/index.php",
+    ]
+    assert filter.filter_urls(iter(urls), mode="rule") == [filter.filter_url(u, mode="rule") for u in urls]
+
+# Test für die gemeinsame Nutzung eines Filters durch mehrere Threads
+def test_filter_shared_between_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    filter = Filter(use_adguard=False)
+    urls = [
+        f"https://www.bilibili.com/video/{i}?share_source=more&ts={i}&p={i}" if i % 2 else
+        f"http://test.com/index.php?id={i}&utm_source=test"
+        for i in range(2000)
+    ]
+    expected = [
+        f"https://www.bilibili.com/video/{i}?p={i}" if i % 2 else f"http://test.com/index.php?id={i}"
+        for i in range(2000)
+    ]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda u: filter.filter_url(u, mode="rule"), urls))
+
+    assert results == expected
+    assert not hasattr(filter, "url")
+
+# Tests für den Ergebnis-Cache
+from clearurl.cache import ResultCache, split_origin
+
+def test_split_origin_canonical():
+    assert split_origin("HTTPS://User@WWW.Example.com:443/a?b=1") == (
+        "https://User@www.example.com", "HTTPS://User@WWW.Example.com:443", "/a?b=1")
+    assert split_origin("http://example.com:8080?x=1")[0] == "http://example.com:8080"
+    assert split_origin("http://[::1]:80/")[0] == "http://[::1]"
+    assert split_origin("mailto:someone@example.com") is None
+
+def test_result_cache_lru_and_bytes():
+    cache = ResultCache(maxsize=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.info()["hits"] == 1 and cache.info()["misses"] == 1
+
+    small = ResultCache(maxsize=100, max_bytes=200)
+    for i in range(10):
+        small.put(f"key{i}", "x" * 20)
+    assert small.bytes <= 200 and len(small) < 10
+
+def test_filter_cache():
+    filter = Filter(use_adguard=False, cache_size=100)
+    url = "http://test.com/index.php?id=123&utm_source=test"
+
+    assert filter.filter_url(url, mode="rule") == "http://test.com/index.php?id=123"
+    assert filter.filter_url("http://TEST.com:80/index.php?id=123&utm_source=test", mode="rule") == "http://TEST.com:80/index.php?id=123"
+    assert filter.cache_info()["hits"] == 1
+    assert filter.filter_urls([url], mode="rule") == ["http://test.com/index.php?id=123"]
+    assert filter.cache_info()["hits"] == 2
+
+    # Änderungen an den Regeln leeren den Cache
+    filter.add_to_rule("test.com", ["id"])
+    assert filter.cache_info()["size"] == 0
+    assert filter.filter_url(url, mode="rule") == "http://test.com/index.php?utm_source=test"
+
+# Test für den Stream-Modus
+def test_clean_stream_gzip(tmp_path):
+    import io
+    import gzip
+    import json
+    from clearurl.stream import iter_urls, clean_stream
+
+    path = tmp_path / "urls.txt.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("http://test.com/index.php?id=1&utm_source=x\n\nhttps://www.example.com/plain\n")
+
+    out = io.StringIO()
+    filter = Filter(use_adguard=False)
+    count = clean_stream(filter, iter_urls([str(path)]), out, mode="rule", json_output=True, chunk_size=1)
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert count == 2
+    assert records[0] == {
+        "original_url": "http://test.com/index.php?id=1&utm_source=x",
+        "cleaned_url": "http://test.com/index.php?id=1",
+        "was_cleaned": True
+    }
+    assert records[1]["was_cleaned"] is False
+
+# Test für die parallele Filterung in mehreren Prozessen
+def test_filter_urls_parallel():
+    from clearurl.parallel import filter_urls_parallel
+
+    urls = [f"http://test.com/{i}?id={i}&utm_source=x" for i in range(500)]
+    filter = Filter(use_adguard=False)
+
+    results = filter_urls_parallel(urls, workers=2, mode="rule", chunk_size=37, filter=filter, use_adguard=False)
+    assert results == [f"http://test.com/{i}?id={i}" for i in range(500)]
+
+# Tests für den Daemon
+def test_server_http_keep_alive():
+    import json
+    import threading
+    import http.client
+    from clearurl.server import make_server
+
+    server = make_server(Filter(use_adguard=False), port=0, mode="rule")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        conn.request("POST", "/clean", json.dumps({"url": "http://test.com/?id=1&utm_source=x"}))
+        assert json.loads(conn.getresponse().read()) == {"cleaned_url": "http://test.com/?id=1"}
+
+        # Zweite Anfrage über dieselbe Verbindung
+        conn.request("POST", "/clean", json.dumps({"urls": ["https://twitter.com/a?s=12", "http://a.com/"]}))
+        assert json.loads(conn.getresponse().read()) == {"cleaned_urls": ["https://twitter.com/a", "http://a.com/"]}
+
+        conn.request("POST", "/clean", json.dumps({"url": "http://a.com/", "mode": "bogus"}))
+        assert conn.getresponse().status == 400
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_server_unix_pipelining(tmp_path):
+    import json
+    import socket
+    import threading
+    from clearurl.server import make_server
+
+    path = str(tmp_path / "clearurl.sock")
+    server = make_server(Filter(use_adguard=False), socket_path=path, mode="rule")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(path)
+            sock.sendall(b"http://test.com/?utm_source=x\n" + json.dumps({"urls": ["http://t.co/x?ssr=1"]}).encode() + b"\n")
+            reader = sock.makefile("rb")
+            assert json.loads(reader.readline()) == {"cleaned_url": "http://test.com/"}
+            assert json.loads(reader.readline()) == {"cleaned_urls": ["http://t.co/x"]}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+# Test für den binären Regel-Snapshot
+def test_compiled_rules_snapshot(tmp_path):
+    import shutil
+    import clearurl.clearurl as module
+
+    rule_file = tmp_path / "rules.yaml"
+    shutil.copyfile(os.path.join(os.path.dirname(module.__file__), "rules", "default_rules.yaml"), rule_file)
+    snapshot = str(tmp_path / "rules.bin")
+
+    original = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=snapshot)
+    original.rules["hosts"]["*.snapshot.test"] = {"query": ["x"], "fragment": True}
+    assert original.compile_rules()
+
+    # Der Snapshot wird statt der YAML-Datei geladen
+    loaded = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=snapshot)
+    assert "*.snapshot.test" in loaded.rules["hosts"]
+    assert loaded.filter_url("https://a.snapshot.test/?x=1&y=2", mode="rule") == "https://a.snapshot.test/?y=2"
+
+    # Andere Einstellungen oder geänderte Quelldateien machen den Snapshot ungültig
+    other = Filter(rule_file=str(rule_file), use_adguard=True, auto_update=False, snapshot_file=False)
+    other.snapshot_file = snapshot
+    assert not other.load_compiled_rules()
+    with open(rule_file, "a", encoding="utf-8") as f:
+        f.write("\n# geändert\n")
+    assert "*.snapshot.test" not in Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=snapshot).rules["hosts"]
+
+    # Der veraltete Snapshot wurde dabei erneuert und gilt beim nächsten Start wieder
+    fresh = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=snapshot)
+    assert fresh.load_compiled_rules()
+    assert "*.snapshot.test" not in fresh.rules["hosts"]
+
+# Tests für die gleichzeitigen Abrufe im Auto-Modus
+def test_filter_auto_concurrent_probes(monkeypatch):
+    import time
+
+    def slow_get_url_content(url):
+        time.sleep(0.2)
+        return b"Artikel 42" if "id=42" in url else b"Startseite"
+
+    monkeypatch.setattr(clearurl, "get_url_content", slow_get_url_content)
+    filter = Filter(use_adguard=False, self_study=False, probe_workers=8)
+
+    start = time.monotonic()
+    url = "https://news.example.org/a?id=42&a=1&b=2&c=3&d=4&e=5"
+    assert filter.filter_url(url, mode="auto") == "https://news.example.org/a?id=42"
+    assert time.monotonic() - start < 0.2 * 4
+
+def test_filter_auto_deadline(monkeypatch):
+    import time
+
+    def hanging_get_url_content(url):
+        if "a=1" not in url:
+            time.sleep(1)
+        return b"Seite"
+
+    monkeypatch.setattr(clearurl, "get_url_content", hanging_get_url_content)
+    filter = Filter(use_adguard=False, self_study=False, probe_deadline=0.2)
+
+    # Varianten ohne Ergebnis innerhalb der Frist behalten ihren Parameter
+    url = "https://slow.example.org/?a=1&b=2"
+    assert filter.filter_url(url, mode="auto") == "https://slow.example.org/?a=1"
+
+# Tests für die Gruppensuche im Auto-Modus
+def mock_page_by_id(url):
+    return b"Artikel 7" if "id=7" in url else b"Startseite"
+
+def test_filter_auto_group_strategy(monkeypatch):
+    monkeypatch.setattr(clearurl, "get_url_content", mock_page_by_id)
+    params = "&".join(f"p{i}=1" for i in range(15))
+    url = f"https://shop.example.org/item?id=7&{params}"
+
+    single = Filter(use_adguard=False, self_study=False)
+    group = Filter(use_adguard=False, self_study=False, probe_strategy="group")
+    stats = {}
+    parsed = Url(url)
+    group.filter_auto(parsed, stats)
+
+    assert parsed.get_url() == "https://shop.example.org/item?id=7"
+    assert single.filter_url(url, mode="auto") == parsed.get_url()
+    assert single.probe_stats["probes"] == 17
+    assert stats["probes"] == 10 and sorted(stats["removed"]) == sorted(f"p{i}" for i in range(15))
+
+    # Alle Parameter entbehrlich: ein Abruf für das Original, einer für alle Parameter
+    assert group.filter_url("https://shop.example.org/?a=1&b=2&c=3", mode="auto") == "https://shop.example.org/"
+    assert group.probe_stats["probes"] == 12
+
+def test_filter_auto_max_probes(monkeypatch):
+    monkeypatch.setattr(clearurl, "get_url_content", mock_page_by_id)
+    filter = Filter(use_adguard=False, self_study=False, max_probes=3)
+
+    # Nur zwei Parameter können geprüft werden, der dritte bleibt erhalten
+    assert filter.filter_url("https://shop.example.org/?a=1&b=2&c=3", mode="auto") == "https://shop.example.org/?c=3"
+    assert filter.probe_stats["probes"] == 3
+
+# Tests für den Seitenvergleich im Auto-Modus
+def test_minhash_similarity():
+    from clearurl.similarity import MinHashSimilarity
+
+    engine = MinHashSimilarity()
+    body = b" ".join(b"wort%d" % (i % 997) for i in range(20000))
+    template = (b'<html><meta name="csrf-token" content="%s"><script nonce="%s">var t = %d;</script>'
+                b'<time>2024-05-01T12:%d:59Z</time><body>' + body + b'</body></html>')
+    page = template % (b"x1y2", b"abc", 1700000000123, 30)
+    volatile = template % (b"q9z8", b"def", 1700000004567, 31)
+    original = engine.fingerprint(page)
+
+    assert len(original) <= engine.num_hashes
+    assert engine.similarity(original, engine.fingerprint(volatile)) == 1.0
+    # Blockweise berechnete Fingerabdrücke entsprechen denen des ganzen Inhalts
+    assert engine.fingerprint(page[i:i + 1000] for i in range(0, len(page), 1000)) == original
+    # Auch bei Blöcken mit weniger Tokens, als ein Shingle umfasst
+    assert engine.fingerprint([b"a b ", b"c d e f g h i j"]) == engine.fingerprint(b"a b c d e f g h i j")
+    assert engine.fingerprint(body[i:i + 7] for i in range(0, len(body), 7)) == engine.fingerprint(body)
+    assert engine.similarity(original, engine.fingerprint(b"<html>Fehler 404</html>")) < 0.1
+
+def test_filter_auto_similarity_engine(monkeypatch):
+    monkeypatch.setattr(clearurl, "get_url_content", mock_get_url_content)
+
+    for engine in ("minhash", "sequence"):
+        filter = Filter(use_adguard=False, self_study=False, similarity=engine)
+        url = "https://www.example.com/page?param1=value1&param2=value2"
+        assert filter.filter_url(url, mode="auto") == url
+
+# Test für den Urteilsspeicher des Auto-Modus
+def test_filter_auto_verdict_store(tmp_path, monkeypatch):
+    from clearurl.verdicts import VerdictStore, REMOVABLE, REQUIRED
+
+    monkeypatch.setattr(clearurl, "get_url_content", mock_page_by_id)
+    path = str(tmp_path / "verdicts.sqlite3")
+    url = "https://shop.example.org/item?id=7&ref=mail"
+
+    first = Filter(use_adguard=False, self_study=False, verdicts=path)
+    assert first.filter_url(url, mode="auto") == "https://shop.example.org/item?id=7"
+    assert first.probe_stats["probes"] == 3
+
+    # Ein neuer Filter mit derselben Datei prüft nichts mehr
+    second = Filter(use_adguard=False, self_study=False, verdicts=path)
+    stats = {}
+    parsed = Url(url)
+    second.filter_auto(parsed, stats)
+    assert parsed.get_url() == "https://shop.example.org/item?id=7"
+    assert stats == {"probes": 0, "removed": ["ref"], "cached": 2}
+    assert second.verdicts.get_many("shop.example.org", ["id", "ref", "x"]) == {"id": REQUIRED, "ref": REMOVABLE}
+
+    # Abgelaufene Urteile werden ignoriert
+    expired = VerdictStore(path, removable_ttl=-1, required_ttl=-1)
+    expired.put("shop.example.org", "id", REQUIRED)
+    assert VerdictStore(path).get("shop.example.org", "id") is None
+
+# Test für das Lern-Journal
+def test_filter_learning_journal(tmp_path, monkeypatch):
+    import yaml
+
+    monkeypatch.setattr(clearurl, "get_url_content", mock_page_by_id)
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text("hosts:\n  twitter.com:\n    query: [s]\ndefault: []\n", encoding="utf-8")
+    before = rule_file.read_text(encoding="utf-8")
+
+    first = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False)
+    second = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False)
+    assert first.filter_url("https://shop.example.org/item?id=7&ref=mail", mode="auto") == "https://shop.example.org/item?id=7"
+    assert second.filter_url("https://blog.example.org/?id=7&utm_x=1", mode="auto") == "https://blog.example.org/?id=7"
+
+    # Gelerntes wird angehängt und sofort angewendet, die Regeldatei bleibt unverändert
+    assert rule_file.read_text(encoding="utf-8") == before
+    assert first.filter_url("https://shop.example.org/item?id=8&ref=x", mode="rule") == "https://shop.example.org/item?id=8"
+    assert len(first.journal.read()) == 2
+
+    # Ein neuer Prozess übernimmt die Einträge beider Filter
+    third = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False)
+    assert third.rules["hosts"]["blog.example.org"]["query"] == ["utm_x"]
+    assert third.compact_rules() == 2
+    assert third.journal.read() == []
+    rules = yaml.safe_load(rule_file.read_text(encoding="utf-8"))
+    assert rules["hosts"]["shop.example.org"]["query"] == ["ref"]
+    assert rules["hosts"]["twitter.com"]["query"] == ["s"]
+
+def test_filter_deferred_learning(tmp_path, monkeypatch):
+    monkeypatch.setattr(clearurl, "get_url_content", mock_page_by_id)
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text("hosts: {}\ndefault: []\n", encoding="utf-8")
+    filter = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False, deferred_learning=True)
+    url = "https://shop.example.org/item?id=7&ref=mail"
+
+    # Das Regelergebnis kommt sofort, die Erkennung läuft im Hintergrund
+    assert filter.filter_url(url) == url
+    filter.learning_queue.join()
+    assert filter.filter_url(url) == "https://shop.example.org/item?id=7"
+    assert filter.learning_queue.stats["processed"] == 1
+
+    # Gleichartige URLs werden nur einmal eingereiht
+    filter.learning_queue.close()
+    other = Url("https://blog.example.org/?id=7&x=1")
+    assert filter.learning_queue.submit(other)
+    assert not filter.learning_queue.submit(Url("https://blog.example.org/?x=2&id=8"))
+    assert filter.learning_queue.stats["duplicates"] == 1
+
+# Test für die bedingte Aktualisierung der AdGuard-Listen
+def test_update_adguard_rules_conditional(tmp_path):
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from clearurl import updater
+
+    lists = {
+        "/specific.txt": "||example.com^$removeparam=spm\n",
+        "/general.txt": "$removeparam=utm_source\n",
+    }
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            etag = f'"{hash(lists[self.path])}"'
+            requests_seen.append((self.path, self.headers.get("If-None-Match")))
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = lists[self.path].encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = (base + "/specific.txt", base + "/general.txt")
+    rule_file = tmp_path / "adguard_rules.yaml"
+    try:
+        assert updater.update_adguard_rules(force=True, file_path=str(rule_file), urls=urls)
+        assert updater.load_adguard_rules(str(rule_file))["hosts"]["example.com"]["query"] == ["spm"]
+        mtime = rule_file.stat().st_mtime_ns
+
+        # Unverändert: beide Listen antworten mit 304, die Regeldatei bleibt unberührt
+        requests_seen.clear()
+        assert updater.update_adguard_rules(force=True, file_path=str(rule_file), urls=urls)
+        assert rule_file.stat().st_mtime_ns == mtime
+        assert sorted(requests_seen) == [("/general.txt", f'"{hash(lists["/general.txt"])}"'),
+                                         ("/specific.txt", f'"{hash(lists["/specific.txt"])}"')]
+        assert not updater.should_update_rules(str(rule_file))
+
+        # Eine geänderte Liste führt zum Neuaufbau mit beiden Listen; die
+        # unveränderte wird nicht erneut geladen
+        lists["/general.txt"] = "$removeparam=fbclid\n"
+        requests_seen.clear()
+        assert updater.update_adguard_rules(force=True, file_path=str(rule_file), urls=urls)
+        rules = updater.load_adguard_rules(str(rule_file))
+        assert rules["default"] == ["fbclid"]
+        assert rules["hosts"]["example.com"]["query"] == ["spm"]
+        assert [seen for seen in requests_seen if seen[0] == "/specific.txt"] == [
+            ("/specific.txt", f'"{hash(lists["/specific.txt"])}"')]
+
+        # Fehlt die gespeicherte Fassung, wird die Liste vollständig nachgeladen
+        os.remove(updater.get_list_path(urls[0], str(rule_file)))
+        lists["/general.txt"] = "$removeparam=gclid\n"
+        requests_seen.clear()
+        assert updater.update_adguard_rules(force=True, file_path=str(rule_file), urls=urls)
+        assert updater.load_adguard_rules(str(rule_file))["hosts"]["example.com"]["query"] == ["spm"]
+        assert ("/specific.txt", None) in requests_seen
+        assert os.path.exists(updater.get_list_path(urls[0], str(rule_file)))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_should_update_rules_reads_header_only(tmp_path, monkeypatch):
+    from datetime import datetime
+    from clearurl import updater
+
+    rule_file = tmp_path / "adguard_rules.yaml"
+    rules = updater.parse_adguard_rules(["||example.com^$removeparam=spm"], [])
+    updater.save_adguard_rules(rules, str(rule_file))
+    assert rule_file.read_text(encoding="utf-8").startswith("last_updated:")
+
+    # Die Prüfung kommt ohne YAML-Parser aus
+    import yaml
+    monkeypatch.setattr(yaml, "safe_load", None)
+    assert not updater.should_update_rules(str(rule_file))
+    rule_file.write_text("hosts: {}\nlast_updated: '2020-01-01 00:00:00'", encoding="utf-8")
+    assert updater.read_last_updated(str(rule_file)) == datetime(2020, 1, 1)
+    assert updater.should_update_rules(str(rule_file))
+
+def test_parse_adguard_rules_syntax():
+    from clearurl import updater
+
+    stats = {}
+    rules = updater.parse_adguard_rules([
+        "! Kommentar",
+        "||example.com^$removeparam=spm",
+        "||example.com^$removeparam=/^utm_/i",
+        "@@||example.com^$removeparam=ref",
+        "$removeparam=cid,domain=a.com|b.org|~shop.a.com",
+        "||example.com/path$removeparam=x",
+        "@@||safe.org^$removeparam",
+    ], [
+        "$removeparam=gclid",
+        "$removeparam=ref",
+        "$third-party,removeparam=/^pk_/",
+        "$removeparam=~id",
+    ], stats)
+
+    assert rules["hosts"]["example.com"] == {"query": ["spm"], "query_regex": ["(?i:^utm_)"], "keep": ["ref"], "fragment": True}
+    assert rules["hosts"]["b.org"] == {"query": ["cid"], "fragment": True}
+    assert rules["hosts"]["shop.a.com"] == {"keep": ["cid"], "fragment": True}
+    assert rules["hosts"]["safe.org"] == {"query": [], "fragment": True}
+    assert rules["default"] == ["gclid", "ref"]
+    assert rules["default_regex"] == ["^pk_"]
+    assert stats == {"lines": 11, "rules": 8, "skipped": {"comment": 1, "unsupported_pattern": 1, "inverted": 1}}
+
+    # Die Regeln werden vom Filter vollständig angewendet
+    filter = Filter(use_adguard=False)
+    filter.rules = {"hosts": {}, "default": []}
+    filter.adguard_rules = rules
+    filter.merge_adguard_rules()
+    assert filter.filter_url("https://example.com/?UTM_Source=x&spm=1&ref=2&id=3", mode="rule") == "https://example.com/?ref=2&id=3"
+    assert filter.filter_url("https://other.net/?pk_campaign=x&gclid=1&id=3", mode="rule") == "https://other.net/?id=3"
+    assert filter.filter_url("https://shop.a.com/?cid=1&gclid=2", mode="rule") == "https://shop.a.com/?cid=1"
+
+def test_filter_hot_reload(tmp_path):
+    import time
+
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text("hosts:\n  example.com:\n    query: [a]\ndefault: []\n", encoding="utf-8")
+    filter = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False, watch_interval=0.05)
+    try:
+        old_rules = filter.rules
+        assert filter.filter_url("https://example.com/?a=1&b=2", mode="rule") == "https://example.com/?b=2"
+
+        # Fehlerhafte Regeln werden nicht veröffentlicht
+        rule_file.write_text("hosts: [", encoding="utf-8")
+        assert not filter.reload_rule()
+        assert filter.rules is old_rules
+
+        rule_file.write_text("hosts:\n  example.com:\n    query: [b]\ndefault: []\n", encoding="utf-8")
+        deadline = time.monotonic() + 5
+        while filter.rules is old_rules and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert filter.filter_url("https://example.com/?a=1&b=2", mode="rule") == "https://example.com/?a=1"
+        # Der alte Stand bleibt für laufende Aufrufe unverändert
+        assert old_rules["hosts"]["example.com"]["query"] == ["a"]
+    finally:
+        filter.stop_watching()
+
+def test_filter_rule_sets(tmp_path):
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text(
+        "sets:\n"
+        "  tracking: [utm_source, '@ads']\n"
+        "  ads: {ref: ads, list: [gclid]}\n"
+        "hosts:\n"
+        "  example.com:\n"
+        "    query: ['@tracking', spm]\n"
+        "  shop.example.com:\n"
+        "    keep: [utm_source]\n"
+        "default: ['@ads', '@missing']\n",
+        encoding="utf-8")
+    filter = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False)
+
+    remove, keep_fragment, regex, keep = filter.resolve_rule("example.com")
+    assert remove == frozenset({"utm_source", "gclid", "spm"})
+    assert filter.filter_url("https://example.com/?utm_source=x&gclid=1&id=2", mode="rule") == "https://example.com/?id=2"
+    assert filter.filter_url("https://other.org/?utm_source=x&gclid=1", mode="rule") == "https://other.org/?utm_source=x"
+
+    # Gelernte Parameter werden nach dem Ergänzen neu kompiliert
+    filter.add_to_rule("example.com", ["id"])
+    assert filter.filter_url("https://example.com/?utm_source=x&id=2", mode="rule") == "https://example.com/"
+
+# Tests für die Query-Verarbeitung ohne erneutes Kodieren
+def test_query_spans_byte_identical():
+    from clearurl.query import Query
+
+    query = Query("b=%7E1&utm_source=x&a=&a=2&flag&x=a+b")
+    assert query.keys() == ["b", "utm_source", "a", "flag", "x"]
+    assert not query.remove({"gclid"})
+    assert query.to_string() is query.raw
+    assert query.remove({"utm_source", "flag"})
+    assert query.to_string() == "b=%7E1&a=&a=2&x=a+b"
+
+def test_filter_url_keeps_encoding():
+    filter = Filter(use_adguard=False)
+    url = "HTTP://Test.com/index.php?q=caf%C3%A9+au+lait&tag=a&tag=b&empty=#Top"
+    assert filter.filter_url(url, mode="rule") is url
+    assert filter.filter_url("http://test.com/p?b=%7E1&utm_source=x&a=&fbclid=1#frag", mode="rule") == \
+        "http://test.com/p?b=%7E1&a=#frag"
+    assert filter.filter_url("https://twitter.com/a?s=12#x", mode="rule") == "https://twitter.com/a"
+
+def test_url_slots_and_copy():
+    url = Url("https://www.example.com/path?a=1&b=2#frag")
+    assert not hasattr(url, "__dict__")
+    clone = url.copy()
+    clone.parsed_query.remove({"a"})
+    assert clone.get_url() == "https://www.example.com/path?b=2#frag"
+    assert url.get_url() == "https://www.example.com/path?a=1&b=2#frag"
+
+    url.query_dict.pop("b")
+    assert url.copy().get_url() == "https://www.example.com/path?a=1#frag"
+
+# Test für den Import ohne Nebenwirkungen
+def test_import_is_lightweight():
+    import sys
+    import json
+    import subprocess
+
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import clearurl\n"
+        "elapsed = time.perf_counter() - start\n"
+        "import json\n"
+        "heavy = [m for m in ('requests', 'yaml', 'difflib', 'sqlite3') if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy, 'handlers': len(__import__('logging').root.handlers)}))\n"
+    )
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = json.loads(subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True,
+                                       text=True, check=True).stdout)
+    assert result["heavy"] == []
+    assert result["handlers"] == 0
+    # Großzügiges Budget, damit der Test auch auf langsamen Rechnern stabil bleibt
+    assert result["elapsed"] < 0.25
+
+def test_filter_metrics(tmp_path, monkeypatch):
+    import json
+    import threading
+    import http.client
+    from clearurl.metrics import MetricsRegistry
+    from clearurl.server import make_server
+
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text("hosts:\n  '*.example.com':\n    query: [a]\ndefault: [utm_source]\n", encoding="utf-8")
+    metrics = MetricsRegistry()
+    filter = Filter(rule_file=str(rule_file), use_adguard=False, self_study=False, snapshot_file=False,
+                    cache_size=10, verdicts=False, metrics=metrics)
+    monkeypatch.setattr(clearurl, "get_url_content", mock_page_by_id)
+
+    assert filter.filter_url("https://www.example.com/?a=1&b=2", mode="rule") == "https://www.example.com/?b=2"
+    assert filter.filter_url("https://www.example.com/?a=1&b=2", mode="rule") == "https://www.example.com/?b=2"
+    assert filter.filter_url("https://other.test/?utm_source=x&id=7", mode="full") == "https://other.test/?id=7"
+    assert metrics.get("rule_hits_total", rule="*.example.com") == 1
+    assert metrics.get("params_removed_total", param="utm_source") == 1
+    assert metrics.get("cache_hits_total") == 1
+    assert metrics.get("probe_fetches_total") == 2
+    assert metrics.get("urls_total", mode="rule") == 2
+
+    data = metrics.to_dict()
+    stages = {h["labels"]["stage"] for h in data["histograms"]["stage_seconds"]}
+    assert {"parse", "match", "remove", "auto", "rebuild"} <= stages
+    text = metrics.to_prometheus()
+    assert 'clearurl_rule_hits_total{rule="*.example.com"} 1' in text
+    assert 'clearurl_filter_seconds_bucket{mode="rule",le="+Inf"} 2' in text
+
+    # Ohne Registry wird nichts erfasst und der Daemon liefert keine Metriken
+    assert Filter(use_adguard=False, snapshot_file=False).metrics is None
+    server = make_server(filter, port=0, mode="rule")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert b"clearurl_urls_total" in response.read()
+        conn.request("GET", "/metrics?format=json")
+        assert "counters" in json.loads(conn.getresponse().read())
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_filter_hooks_and_chrome_trace(tmp_path, monkeypatch):
+    import json
+    from clearurl.trace import ChromeTraceCollector
+
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text("hosts:\n  example.com:\n    query: [a]\ndefault: [utm_source]\n", encoding="utf-8")
+    filter = Filter(rule_file=str(rule_file), use_adguard=False, self_study=False, snapshot_file=False, verdicts=False)
+    monkeypatch.setattr(clearurl, "get_url_content", mock_page_by_id)
+
+    events = []
+    hook = lambda phase, stage, info: events.append((phase, stage, info))
+    info_of = lambda stage: next(i for p, s, i in events if p == "end" and s == stage)
+    collector = ChromeTraceCollector()
+    filter.add_hook(hook)
+    filter.add_hook(collector)
+
+    assert filter.filter_url("https://example.com/?a=1&b=2", mode="rule") == "https://example.com/?b=2"
+    assert [(p, s) for p, s, _ in events] == [
+        ("begin", "filter_url"), ("begin", "parse"), ("end", "parse"), ("begin", "match"), ("end", "match"),
+        ("begin", "remove"), ("end", "remove"), ("begin", "rebuild"), ("end", "rebuild"), ("end", "filter_url")]
+    info = {s: i for p, s, i in events if p == "end"}
+    assert info["match"]["rule"] == "example.com"
+    assert info["remove"]["removed"] == ["a"]
+    assert info["filter_url"]["changed"] and info["filter_url"]["duration"] >= 0
+
+    events.clear()
+    assert filter.filter_url("https://other.test/?utm_source=x&id=7", mode="full") == "https://other.test/?id=7"
+    assert info_of("match")["rule"] is None
+    assert info_of("auto")["probes"] == 2
+    assert len([1 for p, s, _ in events if (p, s) == ("end", "probe")]) == 2
+
+    path = tmp_path / "trace.json"
+    collector.write(str(path))
+    trace = json.loads(path.read_text(encoding="utf-8"))["traceEvents"]
+    assert {e["ph"] for e in trace} == {"B", "E", "M"}
+    assert sum(e["ph"] == "B" for e in trace) == sum(e["ph"] == "E" for e in trace)
+
+    # Nach dem Entfernen werden keine Ereignisse mehr gemeldet
+    filter.remove_hook(hook)
+    filter.remove_hook(collector)
+    events.clear()
+    filter.filter_url("https://example.com/?a=1", mode="rule")
+    assert events == []
+
+def test_filter_learn_concurrent_with_filtering():
+    import threading
+
+    filter = Filter(use_adguard=False, self_study=False, snapshot_file=False, journal_file=False)
+    for i in range(2000):
+        filter.add_to_rule(f"host{i}.example.net", ["p"])
+    old_rules = filter.rules
+
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                assert filter.filter_url("https://host7.example.net/?p=1&q=2", mode="rule") == "https://host7.example.net/?q=2"
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for i in range(300):
+            filter.add_to_rule(f"new{i}.example.org", ["x"])
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    assert errors == []
+    # Lernen veröffentlicht neue Stände, statt den bisherigen zu verändern
+    assert "new0.example.org" not in old_rules["hosts"]
+    assert filter.filter_url("https://new299.example.org/?x=1&y=2", mode="rule") == "https://new299.example.org/?y=2"
+
+# Test: Journale werden nicht über den atexit-Hook festgehalten
+def test_journal_not_kept_alive(tmp_path):
+    import gc
+    import weakref
+    from clearurl import journal as journal_module
+
+    j = journal_module.RuleJournal(str(tmp_path / "a.jsonl"))
+    j.append("example.org", ["ref"])
+    assert j in journal_module._journals
+    j.close()
+    assert j not in journal_module._journals
+
+    j = journal_module.RuleJournal(str(tmp_path / "b.jsonl"))
+    ref = weakref.ref(j)
+    del j
+    gc.collect()
+    assert ref() is None
+    journal_module._sync_all()
+
+# Test: Neuladen verändert keine über YAML-Anker geteilten Host-Regeln
+def test_filter_reload_keeps_anchors_separate(tmp_path):
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text(
+        "hosts:\n"
+        "  www.example.com: &shared\n"
+        "    query: [a]\n"
+        "  m.example.com: *shared\n"
+        "default: []\n", encoding="utf-8")
+    filter = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False)
+    filter.journal.append("m.example.com", ["b"])
+    assert filter.reload_rule()
+    assert filter.filter_url("https://m.example.com/?a=1&b=2&c=3", mode="rule") == "https://m.example.com/?c=3"
+    assert filter.filter_url("https://www.example.com/?a=1&b=2&c=3", mode="rule") == "https://www.example.com/?b=2&c=3"
+    fresh = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False)
+    assert fresh.rules["hosts"] == filter.rules["hosts"]
+
+# Test: Verdichten schreibt gelernte Parameter nicht in geteilte YAML-Anker
+def test_journal_compact_keeps_anchors_separate(tmp_path):
+    import yaml
+    from clearurl.journal import RuleJournal
+
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text(
+        "hosts:\n"
+        "  www.example.com: &shared\n"
+        "    query: [a]\n"
+        "  m.example.com: *shared\n"
+        "default: []\n", encoding="utf-8")
+    journal = RuleJournal(str(tmp_path / "rules.journal"))
+    journal.append("m.example.com", ["b"])
+    assert journal.compact(str(rule_file)) == 1
+    journal.close()
+    rules = yaml.safe_load(rule_file.read_text(encoding="utf-8"))
+    assert rules["hosts"]["m.example.com"]["query"] == ["a", "b"]
+    assert rules["hosts"]["www.example.com"]["query"] == ["a"]
+
+# Test: Ergebnisse, die während eines Regelwechsels berechnet wurden, landen nicht im Cache
+def test_filter_cache_ignores_results_from_replaced_rules(tmp_path):
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text("hosts:\n  example.com:\n    query: [a]\ndefault: []\n", encoding="utf-8")
+    filter = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False, cache_size=100)
+    apply_mode = filter.apply_mode
+    learned = iter(["b", "c"])
+
+    def apply_mode_then_learn(*args):
+        result = apply_mode(*args)
+        # Neuer Regelstand, während der Aufruf noch mit dem alten rechnet
+        filter.add_to_rule("example.com", [next(learned)])
+        return result
+
+    filter.apply_mode = apply_mode_then_learn
+    assert filter.filter_url("https://example.com/?a=1&b=2", mode="rule") == "https://example.com/?b=2"
+    assert filter.filter_urls(["https://example.com/?a=1&c=2"], mode="rule") == ["https://example.com/?c=2"]
+    del filter.apply_mode
+    assert filter.filter_url("https://example.com/?a=1&b=2", mode="rule") == "https://example.com/"
+    assert filter.filter_urls(["https://example.com/?a=1&c=2"], mode="rule") == ["https://example.com/"]
+
+# Test: MinHash liefert auf beinahe gleichen Seiten dieselbe Skala wie SequenceMatcher.ratio()
+def test_minhash_similarity_matches_ratio_scale():
+    import random
+    from difflib import SequenceMatcher
+    from clearurl.similarity import MinHashSimilarity, tokenize
+
+    engine = MinHashSimilarity()
+    rnd = random.Random(42)
+    words = [b"wort%d" % i for i in range(3000)]
+    base = [rnd.choice(words) for _ in range(3000)]
+
+    def page(changed, seed):
+        # Ein zusammenhängender dynamischer Block (z.B. eine Teaser-Liste)
+        tokens = list(base)
+        block = random.Random(seed)
+        tokens[100:100 + changed] = [block.choice(words) for _ in range(changed)]
+        return b" ".join(tokens)
+
+    for changed, same in ((60, True), (300, False)):
+        a, b = page(changed, 1), page(changed, 2)
+        ratio = SequenceMatcher(None, tokenize(a), tokenize(b), autojunk=False).ratio()
+        estimate = engine.similarity(engine.fingerprint(a), engine.fingerprint(b))
+        assert (estimate > 0.95) == (ratio > 0.95) == same
+        if same:
+            assert abs(estimate - ratio) < 0.03
+
+# Test: Ein Filter mit Hintergrund-Threads wird nicht in die Worker geforkt
+def test_filter_urls_parallel_with_background_threads():
+    from clearurl.parallel import filter_urls_parallel
+
+    urls = [f"http://test.com/{i}?id={i}&utm_source=x" for i in range(100)]
+    filter = Filter(use_adguard=False, deferred_learning=True)
+    try:
+        results = filter_urls_parallel(urls, workers=2, mode="rule", chunk_size=37, filter=filter,
+                                       use_adguard=False)
+        assert results == [f"http://test.com/{i}?id={i}" for i in range(100)]
+        with pytest.raises(ValueError):
+            filter_urls_parallel(urls, workers=2, deferred_learning=True)
+    finally:
+        filter.learning_queue.close()
+
+# Test: Ein geerbter Urteilsspeicher öffnet nach fork eine eigene Verbindung
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork nicht verfügbar")
+def test_verdict_store_after_fork(tmp_path):
+    import multiprocessing
+    from clearurl.verdicts import VerdictStore, REMOVABLE
+
+    store = VerdictStore(str(tmp_path / "verdicts.sqlite3"))
+    store.put("a.example.org", "ref", REMOVABLE)
+    inherited = store._db
+
+    def child():
+        store.put("b.example.org", "ref", REMOVABLE)
+        os._exit(0 if store._db is not inherited else 1)
+
+    process = multiprocessing.get_context("fork").Process(target=child)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert store._db is inherited
+    assert store.get("b.example.org", "ref") == REMOVABLE
+
+# Test: Ungültige Parameter-Muster werden beim Laden verworfen
+def test_filter_invalid_param_patterns(tmp_path, caplog):
+    import logging
+
+    rule_file = tmp_path / "rules.yaml"
+    rule_file.write_text(
+        "hosts:\n"
+        "  example.com:\n"
+        "    query_regex: ['^utm_', '(unclosed']\n"
+        "  other.net:\n"
+        "    query_regex: ['(?P<n>^a)']\n"
+        "default: []\n"
+        "default_regex: ['(?P<n>^pk_)', '(?P<n>^mc_)']\n", encoding="utf-8")
+    with caplog.at_level(logging.WARNING, logger="clearurl.ruleset"):
+        filter = Filter(rule_file=str(rule_file), use_adguard=False, snapshot_file=False)
+    assert sum("(unclosed" in r.getMessage() for r in caplog.records) == 1
+    assert filter.filter_url("https://example.com/?utm_source=x&id=1", mode="rule") == "https://example.com/?id=1"
+    assert filter.filter_url("https://other.net/?ab=1&id=1", mode="rule") == "https://other.net/?id=1"
+    assert filter.filter_url("https://a.org/?pk_x=1&mc_x=2&id=1", mode="rule") == "https://a.org/?mc_x=2&id=1"
+
+# Test: Der Daemon ersetzt nur verwaiste Sockets
+def test_server_unix_socket_path_in_use(tmp_path):
+    import socket
+    from clearurl.server import make_server
+
+    # Reguläre Datei bleibt erhalten
+    path = tmp_path / "clearurl.sock"
+    path.write_text("daten", encoding="utf-8")
+    with pytest.raises(OSError):
+        make_server(Filter(use_adguard=False), socket_path=str(path))
+    assert path.read_text(encoding="utf-8") == "daten"
+    path.unlink()
+
+    # Socket eines laufenden Prozesses bleibt erhalten
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(str(path))
+    listener.listen()
+    with pytest.raises(OSError):
+        make_server(Filter(use_adguard=False), socket_path=str(path))
+    # Nach dessen Ende wird der verwaiste Socket ersetzt
+    listener.close()
+    server = make_server(Filter(use_adguard=False), socket_path=str(path))
+    server.server_close()
+
+# Test: Die Obergrenze des Chrome-Traces lässt Beginn und Ende nie getrennt zurück
+def test_chrome_trace_max_events_balanced():
+    from clearurl.trace import ChromeTraceCollector
+
+    for max_events in range(8):
+        collector = ChromeTraceCollector(max_events=max_events)
+        collector("begin", "filter_url", {})
+        for stage in ("parse", "match", "remove"):
+            collector("begin", stage, {})
+            collector("end", stage, {})
+        collector("end", "filter_url", {})
+        trace = collector.to_dict()["traceEvents"]
+        assert len(trace) <= max_events
+        stack = []
+        for event in trace:
+            if event["ph"] == "B":
+                stack.append(event["name"])
+            elif event["ph"] == "E":
+                assert stack.pop() == event["name"]
+        assert stack == []
+        assert len(trace) - sum(e["ph"] == "M" for e in trace) + collector.dropped == 8
+
 # Stelle die ursprüngliche Funktion nach den Tests wieder her
 def teardown_module(module):
     clearurl.get_url_content = original_get_url_content